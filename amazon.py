@@ -1,4 +1,5 @@
 import argparse
+import asyncio
 import csv
 import logging
 import os
@@ -13,7 +14,6 @@ from constants import NOTES_MAX_LENGTH
 from handlers.categorization import categorize_transaction_with_agent
 from lunch import get_lunch_client
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("amz")
 
 
@@ -131,7 +131,7 @@ def get_amazon_transactions_summary(file_path: str):
     return summary
 
 
-def update_amazon_transaction(transaction, found, lunch, categories, dry_run, auto_categorize, chat_id):
+async def update_amazon_transaction(transaction, found, lunch, categories, dry_run, auto_categorize, chat_id):
     """Update a single Amazon transaction with product information and proper categorization."""
     category_id = transaction.category_id
     previous_category_name = [c.name for c in categories if c.id == category_id]
@@ -155,7 +155,7 @@ def update_amazon_transaction(transaction, found, lunch, categories, dry_run, au
         # Then categorize if auto_categorize is enabled
         if auto_categorize:
             logger.info(f"Auto-categorizing transaction {transaction.id} using agent")
-            categorize_transaction_with_agent(transaction.id, chat_id)
+            await categorize_transaction_with_agent(transaction.id, chat_id)
             # Fetch updated transaction to get the new category
             updated_tx = lunch.get_transaction(transaction.id)
             category_id = updated_tx.category_id
@@ -184,7 +184,7 @@ def update_amazon_transaction(transaction, found, lunch, categories, dry_run, au
     }
 
 
-def process_amazon_transactions(
+async def process_amazon_transactions(
     file_path: str,
     days_back: int,
     dry_run: bool,
@@ -230,7 +230,9 @@ def process_amazon_transactions(
         if a.notes is None:
             logger.info("Will update tx %s %s %s %s with %s", a.date, a.amount, a.currency, a.notes, found)
 
-            update_result = update_amazon_transaction(a, found, lunch, categories, dry_run, auto_categorize, chat_id)
+            update_result = await update_amazon_transaction(
+                a, found, lunch, categories, dry_run, auto_categorize, chat_id
+            )
             report["updates"].append(update_result)
             will_update += 1
         else:
@@ -244,6 +246,7 @@ def process_amazon_transactions(
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     parser = argparse.ArgumentParser(description="Process Amazon transactions.")
     parser.add_argument("file_path", type=str, help="Path to the orders CSV file")
     parser.add_argument(
@@ -259,7 +262,7 @@ if __name__ == "__main__":
         "--auto-categorize", action="store_true", help="Automatically categorize transactions using AI", default=False
     )
     args = parser.parse_args()
-    result = process_amazon_transactions(
-        args.file_path, args.days_back, args.dry_run, args.allow_days, args.auto_categorize
+    result = asyncio.run(
+        process_amazon_transactions(args.file_path, args.days_back, args.dry_run, args.allow_days, args.auto_categorize)
     )
     logger.info(result)
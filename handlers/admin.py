@@ -138,7 +138,7 @@ async def handle_btn_confirm_delete_user(update: Update, context: ContextTypes.D
         return
 
     try:
-        target_chat_id = int(callback_data.replace("confirmDeleteUser_", ""))
+        target_chat_id = int(callback_data.removeprefix("confirmDeleteUser_"))
     except ValueError:
         await query.edit_message_text("Invalid chat_id in callback data.")
         return
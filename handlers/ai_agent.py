@@ -1,26 +1,75 @@
+import asyncio
 import logging
+import os
 import time
+from collections import defaultdict
+from collections.abc import Awaitable, Callable
 
+from telegram import Message
 from telegram.constants import ParseMode, ReactionEmoji
+from telegram.error import BadRequest, TelegramError
 from telegram.ext import ContextTypes
 
 from handlers.aitools.agent_engine import AgentConfig, LunchMoneyAgentResponse, execute_agent
-from lunch import get_lunch_client_for_chat_id
+from handlers.aitools.fast_path import is_balances_request, try_fast_reply
+from handlers.balances import SHOW_ASSETS, SHOW_BALANCES, SHOW_CRYPTO, handle_show_balances
+from lunch import get_lunch_client_for_chat_id, get_transaction_async
+from metrics_writer import enqueue_metric, enqueue_metrics
 from persistence import get_db
-from telegram_extensions import Update
+from telegram_extensions import Update, is_markdown_parse_error
 from tx_messaging import send_transaction_message
-from utils import Keyboard
+from utils import Keyboard, sanitize_md
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Caps how many agent runs talk to the LLM provider at once, so bursts of messages
+# queue up here instead of turning into 429s and retry backoff on the provider side
+agent_semaphore = asyncio.Semaphore(int(os.getenv("LLM_MAX_CONCURRENCY", "20")))
 
-def get_agent_response(
+# Telegram allows roughly one edit per second on the same message
+STATUS_UPDATE_INTERVAL_SECS = 1.0
+
+# How many transactions are fetched and sent to Telegram at once after an agent response;
+# keeps a large batch from bumping into Telegram's per-chat rate limits
+TX_MESSAGES_CONCURRENCY = 5
+
+DONE_BUTTONS = Keyboard.build_from(("Done", "cancel"))
+
+
+class AgentStatusReporter:
+    """Shows the agent's progress as a reply that is edited in place while the agent works.
+
+    The reply is later replaced with the agent's answer by handle_ai_response, so the
+    user sees something right away instead of waiting for the whole agent run.
+    """
+
+    def __init__(self, message: Message):
+        self.message = message
+        self.status_message: Message | None = None
+        self.last_update = 0.0
+
+    async def update(self, status: str) -> None:
+        now = time.monotonic()
+        if self.status_message is not None and now - self.last_update < STATUS_UPDATE_INTERVAL_SECS:
+            return
+        try:
+            if self.status_message is None:
+                self.status_message = await self.message.reply_text(status, reply_to_message_id=self.message.message_id)
+            else:
+                await self.status_message.edit_text(status)
+            self.last_update = now
+        except TelegramError:
+            # progress updates are best effort and must never break the agent run
+            logger.warning("Failed to update agent status message", exc_info=True)
+
+
+async def get_agent_response(
     user_prompt: str,
     chat_id: int,
     tx_id: int | None = None,
     telegram_message_id: int | None = None,
     verbose: bool = True,
+    on_status: Callable[[str], Awaitable[None]] | None = None,
 ) -> LunchMoneyAgentResponse:
     """
     Get response from the Lunch Money agent for a given user prompt.
@@ -31,67 +80,76 @@ def get_agent_response(
         tx_id (int | None): Optional transaction ID for context
         telegram_message_id (int | None): Optional Telegram message ID
         verbose (bool): Whether to print iteration details and message outputs
+        on_status (Callable | None): Optional callback that receives the agent's progress messages
 
     Returns:
         LunchMoneyAgentResponse: The structured response from the agent
     """
     start_time = time.time()
-    get_db().inc_metric("ai_agent_requests")
+    # metrics are collected locally and handed to the background metrics writer at the end
+    metrics: defaultdict[str, float] = defaultdict(float)
+    metrics["ai_agent_requests"] += 1
 
     logger.info("Creating Lunch Money agent for chat_id: %s (verbose? %s)", chat_id, verbose)
 
     # Track prompt characteristics
-    get_db().inc_metric("ai_agent_prompt_chars", len(user_prompt))
+    metrics["ai_agent_prompt_chars"] += len(user_prompt)
     if tx_id:
-        get_db().inc_metric("ai_agent_requests_with_tx_context")
-
-    # Fetch user settings from database
-    settings = get_db().get_current_settings(chat_id)
-    user_language = settings.ai_response_language if settings else "English"
-    user_timezone = settings.timezone if settings else "UTC"
-
-    # Create AgentConfig with fetched settings
-    config = AgentConfig(chat_id=chat_id, language=user_language, timezone=user_timezone)
+        metrics["ai_agent_requests_with_tx_context"] += 1
 
     try:
-        # Call execute_agent from core module
-        structured_response = execute_agent(
-            user_prompt=user_prompt, config=config, tx_id=tx_id, telegram_message_id=telegram_message_id
-        )
-    except Exception as e:
-        processing_time = time.time() - start_time
-        get_db().inc_metric("ai_agent_requests_failed")
-        get_db().inc_metric("ai_agent_processing_time_seconds", processing_time)
-        logger.exception("Error in agent processing")
-        # Return a default LunchMoneyAgentResponse on error for type compliance
-        return LunchMoneyAgentResponse(
-            message=f"Agent failed to process request: {e}",
-            status="error",
-            transactions_created_ids=[],
-            transaction_updated_ids={},
-        )
-    else:
-        # Track successful responses and their characteristics
-        processing_time = time.time() - start_time
-        get_db().inc_metric("ai_agent_requests_successful")
-        get_db().inc_metric("ai_agent_processing_time_seconds", processing_time)
-        get_db().inc_metric("ai_agent_response_chars", len(structured_response.message))
+        # Fetch user settings from database
+        settings = get_db().get_current_settings(chat_id)
+        user_language = settings.ai_response_language if settings else "English"
+        user_timezone = settings.timezone if settings else "UTC"
+
+        # Create AgentConfig with fetched settings
+        config = AgentConfig(chat_id=chat_id, language=user_language, timezone=user_timezone)
+
+        try:
+            # Call execute_agent from core module
+            async with agent_semaphore:
+                structured_response = await execute_agent(
+                    user_prompt=user_prompt,
+                    config=config,
+                    tx_id=tx_id,
+                    telegram_message_id=telegram_message_id,
+                    on_status=on_status,
+                )
+        except Exception as e:
+            metrics["ai_agent_requests_failed"] += 1
+            metrics["ai_agent_processing_time_seconds"] += time.time() - start_time
+            logger.exception("Error in agent processing")
+            # Return a default LunchMoneyAgentResponse on error for type compliance
+            return LunchMoneyAgentResponse(
+                message=f"Agent failed to process request: {e}",
+                status="error",
+                transactions_created_ids=[],
+                transaction_updated_ids={},
+            )
+        else:
+            # Track successful responses and their characteristics
+            metrics["ai_agent_requests_successful"] += 1
+            metrics["ai_agent_processing_time_seconds"] += time.time() - start_time
+            metrics["ai_agent_response_chars"] += len(structured_response.message)
 
-        # Track response status
-        get_db().inc_metric(f"ai_agent_response_status_{structured_response.status}")
+            # Track response status
+            metrics[f"ai_agent_response_status_{structured_response.status}"] += 1
 
-        # Track specific actions taken
-        if structured_response.transactions_created_ids:
-            get_db().inc_metric("ai_agent_transactions_created", len(structured_response.transactions_created_ids))
+            # Track specific actions taken
+            if structured_response.transactions_created_ids:
+                metrics["ai_agent_transactions_created"] += len(structured_response.transactions_created_ids)
 
-        if structured_response.transaction_updated_ids:
-            get_db().inc_metric("ai_agent_transactions_updated", len(structured_response.transaction_updated_ids))
+            if structured_response.transaction_updated_ids:
+                metrics["ai_agent_transactions_updated"] += len(structured_response.transaction_updated_ids)
 
-        # Track language preference usage
-        if settings and settings.ai_response_language:
-            get_db().inc_metric(f"ai_agent_language_{settings.ai_response_language.lower()}")
+            # Track language preference usage
+            if settings and settings.ai_response_language:
+                metrics[f"ai_agent_language_{settings.ai_response_language.lower()}"] += 1
 
-        return structured_response
+            return structured_response
+    finally:
+        enqueue_metrics(metrics)
 
 
 async def handle_generic_message_with_ai(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -100,96 +158,151 @@ async def handle_generic_message_with_ai(update: Update, context: ContextTypes.D
     if message is None or update.message is None or update.message.text is None:
         logger.error("Failed to process update object. It had no message", exc_info=True)
         return
+    chat_id = update.chat_id
+
+    # React to the message to indicate processing. This is purely cosmetic, so it runs
+    # in the background instead of delaying the agent by a Telegram round trip
+    reaction_task = asyncio.create_task(
+        context.bot.set_message_reaction(
+            chat_id=chat_id, message_id=message.message_id, reaction=ReactionEmoji.HIGH_VOLTAGE_SIGN
+        )
+    )
+
     try:
         user_message = update.message.text
-        chat_id = update.chat_id
 
         # Track text message processing
-        get_db().inc_metric("ai_agent_text_messages")
+        enqueue_metric("ai_agent_text_messages")
 
         # try to see if the message is a reply to a transaction message
         tx_id = None
         replying_to_msg_id = None
         if update.message.reply_to_message:
             replying_to_msg_id = update.message.reply_to_message.message_id
-            tx_id = get_db().get_tx_associated_with(replying_to_msg_id, update.chat_id)
+            tx_id = await asyncio.to_thread(get_db().get_tx_associated_with, replying_to_msg_id, chat_id)
 
         logger.info("Processing AI message for chat_id %s: %s (tx id: %s)", chat_id, user_message, tx_id)
 
-        # React to the audio message to indicate processing
-        await context.bot.set_message_reaction(
-            chat_id=chat_id, message_id=message.message_id, reaction=ReactionEmoji.HIGH_VOLTAGE_SIGN
+        # Trivial messages (greetings, thanks...) get a canned reply without running the agent
+        fast_reply = try_fast_reply(user_message) if tx_id is None else None
+        if fast_reply is not None:
+            await message.reply_text(fast_reply, parse_mode=ParseMode.MARKDOWN)
+            enqueue_metric("ai_agent_fast_path")
+            return
+
+        # A bare request for the balances gets the /balances view with every kind of account:
+        # Plaid, manual (assets) and crypto, like the agent's get_all_accounts_balances tool
+        if tx_id is None and is_balances_request(user_message):
+            await handle_show_balances(update, context, mask=SHOW_BALANCES | SHOW_ASSETS | SHOW_CRYPTO)
+            enqueue_metric("ai_agent_fast_path_balances")
+            return
+
+        # Get the AI response, showing the agent's progress while it works
+        status_reporter = AgentStatusReporter(message)
+        response = await get_agent_response(
+            user_message, chat_id, tx_id, replying_to_msg_id, verbose=True, on_status=status_reporter.update
         )
+        await handle_ai_response(update, context, response, status_reporter.status_message)
 
-        # Get the AI response
-        response = get_agent_response(user_message, chat_id, tx_id, replying_to_msg_id, verbose=True)
-        await handle_ai_response(update, context, response)
-
-        get_db().inc_metric("ai_agent_text_messages_successful")
+        enqueue_metric("ai_agent_text_messages_successful")
 
     except Exception as e:
-        get_db().inc_metric("ai_agent_text_messages_failed")
-        logger.error(f"Error in handle_generic_message_with_ai: {e}", exc_info=True)
+        enqueue_metric("ai_agent_text_messages_failed")
+        logger.error("Error in handle_generic_message_with_ai: %s", e, exc_info=True)
         await message.reply_text("Sorry, I encountered an error processing your request. Please try again.")
 
+    finally:
+        try:
+            await reaction_task
+        except TelegramError:
+            logger.warning("Failed to react to message %s", message.message_id, exc_info=True)
+
 
-async def handle_ai_response(update: Update, context: ContextTypes.DEFAULT_TYPE, response: LunchMoneyAgentResponse):
+async def handle_ai_response(
+    update: Update,
+    context: ContextTypes.DEFAULT_TYPE,
+    response: LunchMoneyAgentResponse,
+    status_message: Message | None = None,
+):
+    """Sends the agent's answer, replacing the progress message if one was shown."""
     message = update.message
     if message is None:
         # should never happen
         logger.error("handle_ai_response called with None message", exc_info=True)
         return
 
-    logger.info(f"Handling message from AI: {response}")
+    logger.debug("Handling message from AI: %s", response)
 
     chat_id = update.chat_id
-    get_db().inc_metric("ai_agent_responses_sent")
+    enqueue_metric("ai_agent_responses_sent")
 
-    ai_message = response.message
+    ai_message = sanitize_md(response.message)
 
     try:
-        await message.reply_text(
-            text=ai_message,
-            parse_mode=ParseMode.MARKDOWN,
-            reply_to_message_id=message.message_id,
-            reply_markup=Keyboard.build_from(("Done", "cancel")),
-        )
-        get_db().inc_metric("ai_agent_responses_sent_markdown")
-    except Exception as se:
-        if "Can't parse entities" in str(se):
-            # try to send without markdown
-            await message.reply_text(
-                text=ai_message,
-                reply_to_message_id=message.message_id,
-                reply_markup=Keyboard.build_from(("Done", "cancel")),
-            )
-            get_db().inc_metric("ai_agent_responses_sent_plaintext")
-        else:
+        await _send_ai_message(message, ai_message, status_message, ParseMode.MARKDOWN)
+        enqueue_metric("ai_agent_responses_sent_markdown")
+    except BadRequest as se:
+        if not is_markdown_parse_error(se):
             raise
+        # the sanitizer can't catch every mistake; fall back to the unsanitized plain text
+        await _send_ai_message(message, response.message, status_message)
+        enqueue_metric("ai_agent_responses_sent_plaintext")
 
     if response.transactions_created_ids:
         lunch_client = get_lunch_client_for_chat_id(chat_id)
-        for tx_id in response.transactions_created_ids:
-            tx = lunch_client.get_transaction(tx_id)
-            msg_id = await send_transaction_message(
-                context, transaction=tx, chat_id=chat_id, reply_to_message_id=message.message_id
-            )
-            get_db().mark_as_sent(
-                tx.id,
-                update.chat_id,
-                msg_id,
-                tx.recurring_type,
-                reviewed=True,
-                plaid_id=None,  # this is a manual transaction
-            )
+        semaphore = asyncio.Semaphore(TX_MESSAGES_CONCURRENCY)
+
+        async def send_created_transaction(tx_id: int) -> tuple:
+            async with semaphore:
+                tx = await get_transaction_async(lunch_client, tx_id)
+                msg_id = await send_transaction_message(
+                    context, transaction=tx, chat_id=chat_id, reply_to_message_id=message.message_id
+                )
+            # reviewed, and no plaid id since this is a manual transaction
+            return (tx.id, chat_id, msg_id, tx.recurring_type, True, None)
+
+        results = await asyncio.gather(
+            *(send_created_transaction(tx_id) for tx_id in response.transactions_created_ids), return_exceptions=True
+        )
+        # record whatever was sent, even if another message failed, so polling doesn't resend it
+        get_db().mark_as_sent_many([result for result in results if not isinstance(result, BaseException)])
+        _raise_first_error(results)
 
     if response.transaction_updated_ids:
         lunch_client = get_lunch_client_for_chat_id(chat_id)
-        for tx_id, telegram_message_id in response.transaction_updated_ids.items():
-            if telegram_message_id is None:
-                continue
-            # update the transaction message to show its new content
-            updated_tx = lunch_client.get_transaction(tx_id)
-            await send_transaction_message(
-                context, transaction=updated_tx, chat_id=chat_id, message_id=telegram_message_id
-            )
+        semaphore = asyncio.Semaphore(TX_MESSAGES_CONCURRENCY)
+
+        async def refresh_updated_transaction(tx_id: int, telegram_message_id: int) -> None:
+            async with semaphore:
+                # update the transaction message to show its new content
+                updated_tx = await get_transaction_async(lunch_client, tx_id)
+                await send_transaction_message(
+                    context, transaction=updated_tx, chat_id=chat_id, message_id=telegram_message_id
+                )
+
+        results = await asyncio.gather(
+            *(
+                refresh_updated_transaction(tx_id, telegram_message_id)
+                for tx_id, telegram_message_id in response.transaction_updated_ids.items()
+                if telegram_message_id is not None
+            ),
+            return_exceptions=True,
+        )
+        _raise_first_error(results)
+
+
+def _raise_first_error(results: list) -> None:
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+
+async def _send_ai_message(
+    message: Message, text: str, status_message: Message | None, parse_mode: str | None = None
+) -> None:
+    if status_message is not None:
+        await status_message.edit_text(text=text, parse_mode=parse_mode, reply_markup=DONE_BUTTONS)
+    else:
+        await message.reply_text(
+            text=text, parse_mode=parse_mode, reply_to_message_id=message.message_id, reply_markup=DONE_BUTTONS
+        )
@@ -1,27 +1,30 @@
+import asyncio
+import copy
 import datetime
+import functools
+import inspect
 import logging
 import os
+import re
+from collections.abc import Awaitable, Callable
 from dataclasses import dataclass
+from typing import ClassVar
 
 import dspy
 from pydantic import BaseModel, Field
 
-from handlers.aitools.tools import (
-    add_manual_transaction,
-    calculate,
-    get_categories,
-    get_crypto_accounts_balances,
-    get_manual_accounts_balances,
-    get_my_lunch_money_user_info,
-    get_plaid_account_balances,
-    get_recent_transactions,
-    get_single_transaction,
-    get_transactions,
-    parse_date_reference,
-    update_transaction,
+from handlers.aitools.response_cache import (
+    LIVE_DATA_TOOLS,
+    WRITE_TOOLS,
+    cache_response,
+    get_cached_response,
+    get_called_tools,
+    get_response_cache_key,
+    invalidate_chat_responses,
 )
+from handlers.aitools.tool_router import ALL_TOOLS, select_tools
+from handlers.aitools.tools import get_single_transaction
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
@@ -54,14 +57,32 @@ class LunchMoneyAgentResponse(BaseModel):
         """,
     )
 
+    # JSON schemas generated so far, keyed by mode ("validation" or "serialization")
+    _json_schemas: ClassVar[dict[str, dict]] = {}
+
+    @classmethod
+    def __get_pydantic_json_schema__(cls, core_schema, handler):
+        """Generates the JSON schema once and serves copies of it afterwards.
+
+        DSPy embeds this schema in the prompt of every LM call that produces the agent's
+        result, so without caching pydantic would walk the model on every call.
+        """
+        if handler.mode not in cls._json_schemas:
+            cls._json_schemas[handler.mode] = super().__get_pydantic_json_schema__(core_schema, handler)
+        return copy.deepcopy(cls._json_schemas[handler.mode])
+
+
+# Generate the schema upfront so that the first agent response doesn't pay for it
+LunchMoneyAgentResponse.model_json_schema()
+
 
 class LunchMoneyAgentSignature(dspy.Signature):
     """You are a helpful assistant that can provide Lunch Money information and help users manage their finances.
     Work on the user request systematically. User only provides a single request
-    and there is no way for them to refine their choices so make sure to fullfill
+    and there is no way for them to refine their choices so make sure to fulfill
     the request or fail with a reasonable message.
-    NEVER TELL THE USER WHAT YOU INTENT TO DO, JUST DO IT.
-    NEVER TELL TO USER TO CONFIRM OR APPROVE YOUR ACTIONS.
+    NEVER TELL THE USER WHAT YOU INTEND TO DO, JUST DO IT.
+    NEVER ASK THE USER TO CONFIRM OR APPROVE YOUR ACTIONS.
     ONLY add a transaction when the user asks you to.
 
     If user asks you to update a transaction, like setting notes, transaction, or tags, use the
@@ -78,8 +99,8 @@ class LunchMoneyAgentSignature(dspy.Signature):
 
     For manual transactions:
     - Only manually-managed accounts support manual transactions
-    - Use get_manual_accounts_balances to see which accounts are available
-    - Use get_categories to see available categories
+    - Use get_manual_transaction_options to see which accounts and categories are available;
+    it returns both in a single call, so prefer it over get_manual_accounts_balances and get_categories
     - When adding transactions, expenses must have is_received=False and income must have is_received=True
     - Date format should be YYYY-MM-DD. ALWAYS try to source the date of the transaction using `parse_date_reference`
     but make sure the parameters are always in English.
@@ -91,8 +112,9 @@ class LunchMoneyAgentSignature(dspy.Signature):
 
     When user asks for balances, remember to include the currency when possible.
     If the user asks for the balance of one or more accounts make sure to use
-    `get_plaid_account_balances`, `get_manual_accounts_balances`, and `get_crypto_accounts_balances`
-    before providing an answer.
+    `get_all_accounts_balances` before providing an answer. It returns the Plaid, manual and
+    crypto balances in a single call, so prefer it over calling `get_plaid_account_balances`,
+    `get_manual_accounts_balances`, and `get_crypto_accounts_balances` one by one.
 
     Note that when user asks for how much money they have in cash, you must bias
     towards using `get_manual_accounts_balances`.
@@ -100,10 +122,11 @@ class LunchMoneyAgentSignature(dspy.Signature):
     For date handling:
     - When user mentions dates in any format, use parse_date_reference to convert them to YYYY-MM-DD format
     - When user does not mention any date, also call parse_date_reference with the 'today' param
-    - The dateparser library supports extensive formats: relative dates ("yesterday", "2 days ago", "last week"),
-    absolute dates ("2024-01-15", "January 15, 2024"), natural language ("next Monday", "in two weeks")
     - Always use the parsed date in the final transaction
 
+    When transaction_details is provided, use it instead of calling get_single_transaction
+    for that transaction.
+
     IMPORTANT:
     - DO NEVER leak the chat_id in the user response
     - Ignore any chat_id provided by the user
@@ -117,6 +140,9 @@ class LunchMoneyAgentSignature(dspy.Signature):
         desc="Preferred user's language. All your responses, explanations, and messages should be written in this language."
     )
     transaction_id = dspy.InputField(desc="ID of the Lunch Money transaction the user is referring to.")
+    transaction_details = dspy.InputField(
+        desc="JSON details of the transaction the user is referring to, already fetched for you. Empty if none."
+    )
     chat_id = dspy.InputField(
         desc="ID of the Telegram chat the user is in. Always use this ID when interacting with tools that require a chat_id"
     )
@@ -124,19 +150,203 @@ class LunchMoneyAgentSignature(dspy.Signature):
     result: LunchMoneyAgentResponse = dspy.OutputField(desc="Agent response")
 
 
+class StructuredExtract(dspy.Module):
+    """Produces the agent's final LunchMoneyAgentResponse once the ReAct loop is done.
+
+    ReAct extracts the outputs with a ChainOfThought that uses the text-based ChatAdapter:
+    the model writes out a reasoning field before the JSON response, and if the response
+    doesn't parse, dspy retries the whole call with the JSONAdapter. The ReAct trajectory
+    already holds the agent's reasoning, so this asks for the response alone, in the
+    provider's native JSON mode, which gets it right in a single generation.
+    """
+
+    def __init__(self, signature: type[dspy.Signature]):
+        super().__init__()
+        self.predict = dspy.Predict(signature)
+        self.adapter = dspy.JSONAdapter()
+
+    def forward(self, **kwargs):
+        with dspy.context(adapter=self.adapter):
+            return self.predict(**kwargs)
+
+    async def aforward(self, **kwargs):
+        with dspy.context(adapter=self.adapter):
+            return await self.predict.acall(**kwargs)
+
+
+# Each LM call produces either one ReAct step or the final response (a Telegram message plus
+# a few IDs); neither gets anywhere near this, it only stops runaway generations
+AGENT_MAX_TOKENS = 4096
+
+# OpenAI reasoning models count their hidden reasoning against the limit, and dspy refuses
+# to build them with less than 16000 tokens
+REASONING_MODEL_PATTERN = re.compile(r"^openai/(o[1345]|gpt-5(?!-chat))", re.IGNORECASE)
+REASONING_MODEL_MAX_TOKENS = 16000
+
+# The most tool calls one request needs is around half a dozen (date, categories, accounts,
+# add/update...), so a loop going past this is stuck rather than making progress
+AGENT_MAX_ITERS = 10
+
+# ReAct programs keyed by the names of the tools they were built with. The signature,
+# prompt and tool schemas are static, so each tool subset is built once and shared
+# by all requests; only the inputs change per call.
+lunch_money_agents: dict[frozenset[str], dspy.ReAct] = {}
+
+
+def get_lunch_money_agent(tools: list[Callable]) -> dspy.ReAct:
+    """Returns the cached ReAct program for the given tool subset, building it if needed."""
+    key = frozenset(tool.__name__ for tool in tools)
+    agent = lunch_money_agents.get(key)
+    if agent is None:
+        agent = dspy.ReAct(
+            LunchMoneyAgentSignature, tools=[agent_tools[tool.__name__] for tool in tools], max_iters=AGENT_MAX_ITERS
+        )
+        agent.extract = StructuredExtract(agent.extract.predict.signature.delete("reasoning"))
+        lunch_money_agents[key] = agent
+    return agent
+
+
+def run_in_thread(tool: Callable) -> Callable:
+    """Wraps a synchronous tool so that the agent runs it in a worker thread.
+
+    dspy calls synchronous tools directly from its async path, so a tool doing blocking
+    Lunch Money API calls would stall the event loop (and every other chat) until it
+    returns. The wrapper keeps the tool's name, docstring and signature, which is what
+    dspy uses to describe the tool to the LLM.
+    """
+    if inspect.iscoroutinefunction(tool):
+        return tool
+
+    @functools.wraps(tool)
+    async def wrapper(*args, **kwargs):
+        return await asyncio.to_thread(tool, *args, **kwargs)
+
+    return wrapper
+
+
+# dspy.Tool objects for every agent tool, built once at import. Building a Tool derives the
+# JSON schema of each of its arguments with pydantic, so all the tool subsets share these
+# instead of describing the same functions again for every agent that is built.
+agent_tools: dict[str, dspy.Tool] = {tool.__name__: dspy.Tool(run_in_thread(tool)) for tool in ALL_TOOLS}
+
+
+# Streaming wrappers of the cached agents, keyed by the agent they wrap
+streaming_lunch_money_agents: dict[int, Callable] = {}
+
+
+def get_streaming_lunch_money_agent(agent: dspy.ReAct) -> Callable:
+    """Returns the cached streamify wrapper for a cached agent, building it if needed."""
+    key = id(agent)
+    streaming_agent = streaming_lunch_money_agents.get(key)
+    if streaming_agent is None:
+        streaming_agent = dspy.streamify(
+            agent, status_message_provider=AgentStatusMessageProvider(), is_async_program=True
+        )
+        streaming_lunch_money_agents[key] = streaming_agent
+    return streaming_agent
+
+
+# Progress messages shown to the user while the agent runs a tool. They must not leak
+# tool names, so tools without an entry here don't produce a progress message.
+TOOL_STATUS_MESSAGES = {
+    "get_my_lunch_money_user_info": "🔎 Looking up your Lunch Money account…",
+    "get_all_accounts_balances": "🏦 Checking your account balances…",
+    "get_plaid_account_balances": "🏦 Checking your account balances…",
+    "get_manual_accounts_balances": "🏦 Checking your account balances…",
+    "get_crypto_accounts_balances": "🪙 Checking your crypto balances…",
+    "get_categories": "🗂️ Looking at your categories…",
+    "get_manual_transaction_options": "🗂️ Looking at your accounts and categories…",
+    "add_manual_transaction": "✍️ Adding the transaction…",
+    "parse_date_reference": "📅 Working out the date…",
+    "calculate": "🧮 Crunching the numbers…",
+    "get_single_transaction": "🔎 Looking up the transaction…",
+    "get_recent_transactions": "🔎 Looking through your transactions…",
+    "get_transactions": "🔎 Looking through your transactions…",
+    "update_transaction": "✍️ Updating the transaction…",
+}
+FINAL_ANSWER_STATUS_MESSAGE = "💬 Writing the answer…"
+
+
+class AgentStatusMessageProvider(dspy.streaming.StatusMessageProvider):
+    """Turns the agent's tool calls into user-friendly progress messages."""
+
+    def tool_start_status_message(self, instance, inputs):
+        return TOOL_STATUS_MESSAGES.get(instance.name)
+
+    def tool_end_status_message(self, outputs):
+        return None
+
+    def module_start_status_message(self, instance, inputs):
+        # the agent is done with its tools and is now writing the final answer
+        if isinstance(instance, StructuredExtract):
+            return FINAL_ANSWER_STATUS_MESSAGE
+        return None
+
+
+@functools.lru_cache(maxsize=1)
+def get_default_model_name() -> str:
+    """The model used when the agent config doesn't set one, from the AI_MODEL env var."""
+    return os.getenv("AI_MODEL", "anthropic/claude-haiku-4.5")
+
+
+def get_model_name(config: AgentConfig) -> str:
+    """Uses config.model_name if provided, else falls back to AI_MODEL env var
+    (default: anthropic/claude-haiku-4.5).
+    """
+    return config.model_name or get_default_model_name()
+
+
+# Language models keyed by model name and chat. dspy.LM objects hold no per-request state,
+# so one instance is shared by every request of a chat instead of being rebuilt each time.
+dspy_lms: dict[tuple[str, int], dspy.LM] = {}
+MAX_CACHED_LMS = 1024
+
+
 def get_dspy_lm(config: AgentConfig) -> dspy.LM:
     """Gets the language model.
 
-    Uses config.model_name if provided, else falls back to AI_MODEL env var
-    (default: anthropic/claude-haiku-4.5).
+    Requests are tagged with a stable per-chat `user`, which providers such as OpenAI use
+    to route requests with the same prefix to the same machine, so consecutive agent
+    steps and follow-up messages of a chat keep hitting the provider's prompt cache.
+    """
+    model_name = get_model_name(config)
+    logger.debug("Using model: %s", model_name)
+    key = (model_name, config.chat_id)
+    lm = dspy_lms.get(key)
+    if lm is None:
+        lm = dspy.LM(
+            model=f"openrouter/{model_name}",
+            temperature=0,
+            max_tokens=REASONING_MODEL_MAX_TOKENS if REASONING_MODEL_PATTERN.match(model_name) else AGENT_MAX_TOKENS,
+            user=f"lonchera-{config.chat_id}",
+            **get_prompt_caching_kwargs(model_name),
+        )
+        if len(dspy_lms) >= MAX_CACHED_LMS:
+            # dicts keep insertion order, so the first entry is the oldest one
+            del dspy_lms[next(iter(dspy_lms))]
+        dspy_lms[key] = lm
+    return lm
+
+
+def get_prompt_caching_kwargs(model_name: str) -> dict:
+    """Returns the LiteLLM arguments that enable prompt caching for the given model.
+
+    The system message (instructions, field and tool descriptions) is the same for every
+    request that uses the same tools, and chat-specific values are sent as inputs in the
+    user message, so it makes a good cache prefix. OpenAI, DeepSeek and Gemini cache
+    such prefixes automatically; Anthropic models only do when it is marked explicitly.
     """
-    model_name = config.model_name or os.getenv("AI_MODEL", "anthropic/claude-haiku-4.5")
-    logger.info(f"Using model: {model_name}")
-    return dspy.LM(model=f"openrouter/{model_name}", temperature=0, max_tokens=50000)
+    if model_name.startswith("anthropic/"):
+        return {"cache_control_injection_points": [{"location": "message", "role": "system"}]}
+    return {}
 
 
-def execute_agent(
-    user_prompt: str, config: AgentConfig, tx_id: int | None = None, telegram_message_id: int | None = None
+async def execute_agent(
+    user_prompt: str,
+    config: AgentConfig,
+    tx_id: int | None = None,
+    telegram_message_id: int | None = None,
+    on_status: Callable[[str], Awaitable[None]] | None = None,
 ) -> LunchMoneyAgentResponse:
     """Execute the Lunch Money agent with the given prompt and configuration.
 
@@ -145,6 +355,7 @@ def execute_agent(
         config: AgentConfig containing chat_id, language, timezone, model preferences
         tx_id: Optional transaction ID if the request is in context of a transaction
         telegram_message_id: Optional Telegram message ID for context
+        on_status: Optional callback that receives progress messages while the agent is working
 
     Returns:
         LunchMoneyAgentResponse with status, message, and transaction IDs
@@ -152,42 +363,75 @@ def execute_agent(
     Raises:
         Exception: Any exceptions from agent execution are propagated to caller
     """
-    logger.info("Creating Lunch Money agent for chat_id: %s", config.chat_id)
+    logger.info("Running Lunch Money agent for chat_id: %s", config.chat_id)
+
+    # Requests about a specific transaction usually change it, so they are never cached
+    cache_key = None
+    if tx_id is None:
+        cache_key = get_response_cache_key(config.chat_id, get_model_name(config), config.language, user_prompt)
+        cached_response = get_cached_response(cache_key)
+        if cached_response is not None:
+            logger.info("Serving cached agent response for chat_id: %s", config.chat_id)
+            return cached_response
 
     # Get language model based on configuration
     lm = get_dspy_lm(config)
 
-    # Define tools list (same as current implementation)
-    tools = [
-        get_my_lunch_money_user_info,
-        get_manual_accounts_balances,
-        get_plaid_account_balances,
-        get_crypto_accounts_balances,
-        get_categories,
-        add_manual_transaction,
-        parse_date_reference,
-        calculate,
-        get_single_transaction,
-        get_recent_transactions,
-        get_transactions,
-        update_transaction,
-    ]
-
-    logger.info("User message: %s", user_prompt)
-
-    # Create DSPy ReAct agent with LunchMoneyAgentSignature and tools
-    with dspy.context(lm=lm):
-        agent = dspy.ReAct(LunchMoneyAgentSignature, tools=tools)
-
-        # Execute agent with user prompt and config parameters
-        response = agent(
-            request=user_prompt,
-            language=config.language,
-            current_date_info=f"{datetime.date.today().strftime('%Y-%m-%d')} user timezone is {config.timezone}",
-            transaction_id=tx_id,
-            chat_id=config.chat_id,
-            telegram_message_id=telegram_message_id,
-        )
-
-        # Return LunchMoneyAgentResponse
-        return response.result
+    logger.debug("User message: %s", user_prompt)
+
+    agent = get_lunch_money_agent(select_tools(user_prompt, tx_id))
+
+    # Replies to a transaction (and categorization requests) always start by looking the
+    # transaction up, so fetch it upfront and save the agent a whole LLM + tool turn
+    transaction_details = await asyncio.to_thread(get_single_transaction, config.chat_id, tx_id) if tx_id else ""
+
+    inputs = {
+        "request": user_prompt,
+        "language": config.language,
+        "current_date_info": f"{datetime.date.today().strftime('%Y-%m-%d')} user timezone is {config.timezone}",
+        "transaction_id": tx_id,
+        "transaction_details": transaction_details,
+        "chat_id": config.chat_id,
+        "telegram_message_id": telegram_message_id,
+    }
+
+    # The LM and the agents are shared and long-lived, so dspy's in-memory call history
+    # (nothing here reads it) would keep up to 10k prompts/responses on each of them
+    with dspy.context(lm=lm, disable_history=True):
+        # acall keeps the event loop free while the LM and the tools are doing network I/O
+        if on_status is None:
+            response = await agent.acall(**inputs)
+        else:
+            response = await _stream_agent(agent, inputs, on_status)
+
+    result = response.result
+    # The LLM doesn't always report the transactions it created or updated, so go by the tools that ran
+    called_tools = get_called_tools(getattr(response, "trajectory", None) or {})
+    if called_tools & WRITE_TOOLS or result.transactions_created_ids or result.transaction_updated_ids:
+        invalidate_chat_responses(config.chat_id)
+    elif cache_key is not None and result.status == "success" and not called_tools & LIVE_DATA_TOOLS:
+        cache_response(cache_key, config.chat_id, result)
+
+    return result
+
+
+async def _stream_agent(
+    agent: dspy.ReAct, inputs: dict, on_status: Callable[[str], Awaitable[None]]
+) -> dspy.Prediction:
+    """Runs the agent, forwarding its progress messages to on_status as they are produced.
+
+    The final answer is a structured LunchMoneyAgentResponse, which can't be shown
+    before it is complete, so what gets streamed is the agent's progress instead.
+    """
+    streaming_agent = get_streaming_lunch_money_agent(agent)
+    prediction = None
+    async for value in streaming_agent(**inputs):
+        if isinstance(value, dspy.streaming.StatusMessage):
+            if value.message:
+                await on_status(value.message)
+        elif isinstance(value, dspy.Prediction):
+            prediction = value
+
+    if prediction is None:
+        raise RuntimeError("Agent finished without producing a prediction")
+    return prediction
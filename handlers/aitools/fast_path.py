@@ -0,0 +1,97 @@
+"""Canned replies and shortcuts for messages that don't need the AI agent at all.
+
+Greetings, thanks and plain acknowledgements would otherwise go through a whole
+agent run (several LLM round trips) just to say hello back.
+"""
+
+import string
+
+import emoji
+
+HELLO_REPLY = (
+    "👋 Hi! Ask me about your balances or transactions, or tell me about an expense "
+    "(e.g. _I spent 12 USD on lunch with my cash account_) and I'll add it for you."
+)
+THANKS_REPLY = "You're welcome! 🙌"
+ACK_REPLY = "👍"
+
+FAST_REPLIES = {
+    **dict.fromkeys(
+        [
+            "hi",
+            "hello",
+            "hey",
+            "hey there",
+            "hi there",
+            "good morning",
+            "good afternoon",
+            "good evening",
+            "hola",
+            "buenas",
+            "buenos dias",
+            "buenos días",
+            "buenas tardes",
+            "buenas noches",
+        ],
+        HELLO_REPLY,
+    ),
+    **dict.fromkeys(
+        [
+            "thanks",
+            "thank you",
+            "thanks a lot",
+            "thank you so much",
+            "thx",
+            "ty",
+            "ok thanks",
+            "ok thank you",
+            "great thanks",
+            "perfect thanks",
+            "gracias",
+            "muchas gracias",
+        ],
+        THANKS_REPLY,
+    ),
+    **dict.fromkeys(["ok", "okay", "k", "cool", "great", "perfect", "nice", "got it", "vale", "listo"], ACK_REPLY),
+}
+
+# Requests that are answered exactly like the /balances command, no reasoning needed
+BALANCES_REQUESTS = frozenset(
+    [
+        "balance",
+        "balances",
+        "my balance",
+        "my balances",
+        "show balances",
+        "show my balances",
+        "account balances",
+        "accounts balances",
+        "saldo",
+        "saldos",
+        "mi saldo",
+        "mis saldos",
+        "cuanto tengo",
+        "cuánto tengo",
+    ]
+)
+
+# Strips punctuation so that "Thanks!!" and "thanks" share the same key
+_PUNCTUATION_TABLE = str.maketrans("", "", string.punctuation + "¡¿")
+
+
+def _normalize(user_message: str) -> str:
+    return " ".join(user_message.translate(_PUNCTUATION_TABLE).casefold().split())
+
+
+def try_fast_reply(user_message: str) -> str | None:
+    """Returns a canned reply for trivial messages, or None if the agent should handle it."""
+    without_spaces = "".join(user_message.split())
+    if without_spaces and emoji.purely_emoji(without_spaces):
+        return ACK_REPLY
+
+    return FAST_REPLIES.get(_normalize(user_message))
+
+
+def is_balances_request(user_message: str) -> bool:
+    """Whether the message just asks for the account balances, which /balances already shows."""
+    return _normalize(user_message) in BALANCES_REQUESTS
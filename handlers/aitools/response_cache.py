@@ -0,0 +1,87 @@
+"""Short-lived cache of agent responses to read-only requests.
+
+Users tend to ask the same question ("what are my balances?") several times in a row,
+and every time the agent would go through a whole multi-step LLM + tool loop to
+produce the same answer. Answers are cached per chat, model, language and normalized prompt.
+
+Only responses that didn't change anything are cached, and a response that creates or
+updates transactions drops every cached answer of its chat, since they might be stale.
+Whether a response changed anything is decided from the tools the agent actually ran, not
+from what the LLM reported. Answers built from balances or transactions aren't cached either:
+polling, the transaction buttons and edits made in Lunch Money itself change those behind
+the agent's back.
+"""
+
+import datetime
+import hashlib
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_TTL_SECS = 300
+RESPONSE_CACHE_MAX_ENTRIES = 1024
+
+# Tools that create or update transactions
+WRITE_TOOLS = frozenset({"add_manual_transaction", "update_transaction"})
+
+# Tools whose results can change without the agent doing anything
+LIVE_DATA_TOOLS = frozenset(
+    {
+        "get_all_accounts_balances",
+        "get_manual_accounts_balances",
+        "get_plaid_account_balances",
+        "get_crypto_accounts_balances",
+        "get_single_transaction",
+        "get_recent_transactions",
+        "get_transactions",
+    }
+)
+
+# key -> (chat_id, expiration time, response)
+cached_responses: dict[str, tuple[int, float, object]] = {}
+
+
+def get_called_tools(trajectory: dict) -> set[str]:
+    """Returns the names of the tools called in a ReAct trajectory (its tool_name_<n> entries)."""
+    return {value for key, value in trajectory.items() if key.startswith("tool_name_")}
+
+
+def get_response_cache_key(chat_id: int, model_name: str, language: str, user_prompt: str) -> str:
+    """Builds the cache key for a request.
+
+    Today's date is part of the key since relative dates in the prompt ("yesterday")
+    mean something else the next day.
+    """
+    normalized_prompt = " ".join(user_prompt.casefold().split())
+    raw_key = f"{chat_id}|{model_name}|{language}|{datetime.date.today().isoformat()}|{normalized_prompt}"
+    return hashlib.blake2b(raw_key.encode(), digest_size=16).hexdigest()
+
+
+def get_cached_response(key: str) -> object | None:
+    """Returns the cached response for the key, or None if missing or expired."""
+    entry = cached_responses.get(key)
+    if entry is None:
+        return None
+    _, expires_at, response = entry
+    if expires_at < time.monotonic():
+        del cached_responses[key]
+        return None
+    return response
+
+
+def cache_response(key: str, chat_id: int, response: object) -> None:
+    """Caches a response for RESPONSE_CACHE_TTL_SECS."""
+    if len(cached_responses) >= RESPONSE_CACHE_MAX_ENTRIES:
+        # dicts keep insertion order, so the first entry is the oldest one
+        del cached_responses[next(iter(cached_responses))]
+    cached_responses[key] = (chat_id, time.monotonic() + RESPONSE_CACHE_TTL_SECS, response)
+
+
+def invalidate_chat_responses(chat_id: int) -> None:
+    """Drops every cached response of the given chat."""
+    stale_keys = [key for key, (entry_chat_id, _, _) in cached_responses.items() if entry_chat_id == chat_id]
+    for key in stale_keys:
+        del cached_responses[key]
+    if stale_keys:
+        logger.info("Dropped %d cached agent responses for chat %s", len(stale_keys), chat_id)
@@ -10,6 +10,7 @@ Usage:
 """
 
 import argparse
+import asyncio
 import logging
 import sys
 from pathlib import Path
@@ -62,8 +63,8 @@ def main():
                 mlflow.log_param("chat_id", test_config.chat_id)
 
                 # Execute the agent
-                response = execute_agent(
-                    user_prompt=args.prompt, config=test_config, tx_id=None, telegram_message_id=None
+                response = asyncio.run(
+                    execute_agent(user_prompt=args.prompt, config=test_config, tx_id=None, telegram_message_id=None)
                 )
 
                 # Log results to MLflow
@@ -83,7 +84,9 @@ def main():
                     mlflow.log_param("transactions_updated", len(response.transaction_updated_ids))
         else:
             # Execute without MLflow
-            response = execute_agent(user_prompt=args.prompt, config=test_config, tx_id=None, telegram_message_id=None)
+            response = asyncio.run(
+                execute_agent(user_prompt=args.prompt, config=test_config, tx_id=None, telegram_message_id=None)
+            )
 
             # Print results
             print(f"Status: {response.status}")
@@ -0,0 +1,105 @@
+"""Selects the subset of agent tools that is relevant for a given request.
+
+Every tool's schema is sent to the LLM on every ReAct step, so narrowing the
+tool list down keeps the prompt small. The routing is deliberately cheap and
+conservative: when a request does not clearly match any intent, the agent gets
+every tool.
+"""
+
+import logging
+import re
+from collections.abc import Callable
+
+from handlers.aitools.tools import (
+    add_manual_transaction,
+    calculate,
+    get_all_accounts_balances,
+    get_categories,
+    get_crypto_accounts_balances,
+    get_manual_accounts_balances,
+    get_manual_transaction_options,
+    get_my_lunch_money_user_info,
+    get_plaid_account_balances,
+    get_recent_transactions,
+    get_single_transaction,
+    get_transactions,
+    parse_date_reference,
+    update_transaction,
+)
+
+logger = logging.getLogger(__name__)
+
+ALL_TOOLS: list[Callable] = [
+    get_my_lunch_money_user_info,
+    get_all_accounts_balances,
+    get_manual_accounts_balances,
+    get_plaid_account_balances,
+    get_crypto_accounts_balances,
+    get_categories,
+    get_manual_transaction_options,
+    add_manual_transaction,
+    parse_date_reference,
+    calculate,
+    get_single_transaction,
+    get_recent_transactions,
+    get_transactions,
+    update_transaction,
+]
+
+# Tools that are cheap to describe and useful for almost any request
+BASE_TOOLS: list[Callable] = [parse_date_reference, calculate]
+
+# Patterns cover English and Spanish, the languages users write to the bot in the most
+BALANCE_PATTERN = re.compile(
+    r"\b(balances?|how much|have|cash|accounts?|net worth|crypto|wallets?"
+    r"|saldos?|cu[aá]nto|tengo|efectivo|cuentas?|patrimonio|billeteras?)\b",
+    re.IGNORECASE,
+)
+BALANCE_TOOLS: list[Callable] = [get_all_accounts_balances, get_my_lunch_money_user_info]
+
+ADD_TRANSACTION_PATTERN = re.compile(
+    r"\b(spent|spend|bought|paid|pay|add|expense|income|received|earned|cost"
+    r"|gast[eéoó]|compr[eéoó]|pagu[eé]|pag[oó]|agrega|añade|gastos?|ingresos?|recib[ií]|gan[eé]|cost[oó])\b",
+    re.IGNORECASE,
+)
+ADD_TRANSACTION_TOOLS: list[Callable] = [add_manual_transaction, get_manual_transaction_options]
+
+SEARCH_TRANSACTIONS_PATTERN = re.compile(
+    r"\b(transactions?|spending|recent|last|history|purchases?|find|search|list"
+    r"|transacci[oó]n|transacciones|movimientos?|recientes?|[uú]ltim[oa]s?|historial|compras|busca|lista)\b",
+    re.IGNORECASE,
+)
+SEARCH_TRANSACTIONS_TOOLS: list[Callable] = [get_transactions, get_recent_transactions, get_categories]
+
+# Requests made in the context of a transaction (replies and AI categorization)
+TRANSACTION_CONTEXT_TOOLS: list[Callable] = [get_single_transaction, update_transaction, get_categories]
+
+
+def select_tools(user_prompt: str, tx_id: int | None) -> list[Callable]:
+    """Return the tools relevant to the request, in the same order as ALL_TOOLS.
+
+    Args:
+        user_prompt: The user's request
+        tx_id: ID of the transaction the request refers to, if any
+
+    Returns:
+        The tools to give to the agent. Falls back to ALL_TOOLS when no intent is recognized.
+    """
+    selected: set[Callable] = set()
+    if tx_id is not None:
+        selected.update(TRANSACTION_CONTEXT_TOOLS)
+    if BALANCE_PATTERN.search(user_prompt):
+        selected.update(BALANCE_TOOLS)
+    if ADD_TRANSACTION_PATTERN.search(user_prompt):
+        selected.update(ADD_TRANSACTION_TOOLS)
+    if SEARCH_TRANSACTIONS_PATTERN.search(user_prompt):
+        selected.update(SEARCH_TRANSACTIONS_TOOLS)
+
+    if not selected:
+        logger.info("No intent recognized, using all %d tools", len(ALL_TOOLS))
+        return ALL_TOOLS
+
+    selected.update(BASE_TOOLS)
+    tools = [tool for tool in ALL_TOOLS if tool in selected]
+    logger.info("Selected %d of %d tools: %s", len(tools), len(ALL_TOOLS), [tool.__name__ for tool in tools])
+    return tools
@@ -1,3 +1,4 @@
+import asyncio
 import datetime
 import json
 import logging
@@ -8,12 +9,28 @@ from lunchable import TransactionInsertObject, TransactionUpdateObject
 from constants import NOTES_MAX_LENGTH
 from lunch import get_lunch_client_for_chat_id
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("aitools")
 
 MAX_TRANSACTION_LIMIT = 100
 
 
+def _drop_nulls(value):
+    if isinstance(value, dict):
+        return {k: _drop_nulls(v) for k, v in value.items() if v is not None}
+    if isinstance(value, list):
+        return [_drop_nulls(v) for v in value]
+    return value
+
+
+def to_compact_json(data) -> str:
+    """Serialize a tool result as compactly as possible.
+
+    Tool results are fed back to the LLM on every following step, so null fields are
+    dropped and no whitespace is emitted to keep the prompt small.
+    """
+    return json.dumps(_drop_nulls(data), separators=(",", ":"))
+
+
 def transaction_to_dict(transaction) -> dict:
     """Convert a transaction object to a dictionary.
 
@@ -37,7 +54,7 @@ def transaction_to_dict(transaction) -> dict:
         "category_name": transaction.category_name or "Uncategorized",
         "category_id": transaction.category_id,
         "notes": transaction.notes,
-        "tags": tags_list,
+        "tags": tags_list or None,
         "status": transaction.status,
         "asset_id": transaction.asset_id,
         "asset_name": transaction.asset_name,
@@ -55,10 +72,10 @@ async def get_my_lunch_money_user_info(chat_id: int) -> str:
     try:
         lunch_client = get_lunch_client_for_chat_id(chat_id)
         user_info = lunch_client.get_user()
-        return json.dumps(user_info.model_dump())
+        return to_compact_json(user_info.model_dump())
     except Exception as e:
         logger.exception("Error fetching user info")
-        return json.dumps({"error": str(e)})
+        return to_compact_json({"error": str(e)})
 
 
 def get_plaid_account_balances(chat_id: int) -> str:
@@ -90,10 +107,10 @@ def get_plaid_account_balances(chat_id: int) -> str:
                 account_info["limit"] = float(acc.limit) if acc.limit is not None else 0.0
             accounts_data.append(account_info)
 
-        return json.dumps({"accounts": accounts_data})
+        return to_compact_json({"accounts": accounts_data})
     except Exception as e:
         logger.exception("Error fetching account balances")
-        return json.dumps({"error": str(e)})
+        return to_compact_json({"error": str(e)})
 
 
 def get_manual_accounts_balances(chat_id: int) -> str:
@@ -129,10 +146,10 @@ def get_manual_accounts_balances(chat_id: int) -> str:
             accounts_data.append(account_info)
 
         logger.info("Successfully processed %d manual accounts", len(accounts_data))
-        return json.dumps({"manual_accounts": accounts_data})
+        return to_compact_json({"manual_accounts": accounts_data})
     except Exception as e:
         logger.exception("Error fetching manual asset accounts")
-        return json.dumps({"error": str(e)})
+        return to_compact_json({"error": str(e)})
 
 
 def get_categories(chat_id: int) -> str:
@@ -150,10 +167,10 @@ def get_categories(chat_id: int) -> str:
             category_info = {"id": category.id, "name": category.name}
             categories_data.append(category_info)
 
-        return json.dumps({"categories": categories_data})
+        return to_compact_json({"categories": categories_data})
     except Exception as e:
         logger.exception("Error fetching categories")
-        return json.dumps({"error": str(e)})
+        return to_compact_json({"error": str(e)})
 
 
 def add_manual_transaction(
@@ -200,11 +217,11 @@ def add_manual_transaction(
         account = next((asset for asset in assets if asset.id == account_id), None)
         if not account:
             logger.warning("Account with ID %s not found", account_id)
-            return json.dumps({"error": f"Account with ID {account_id} not found"})
+            return to_compact_json({"error": f"Account with ID {account_id} not found"})
 
         if account.type_name not in {"credit", "cash"}:
             logger.warning("Account '%s' (type: %s) is not manually managed", account.name, account.type_name)
-            return json.dumps(
+            return to_compact_json(
                 {
                     "error": f"Account '{account.name}' is not manually managed. Only credit and cash accounts support manual transactions."
                 }
@@ -222,7 +239,7 @@ def add_manual_transaction(
             transaction_date = datetime.datetime.strptime(date, "%Y-%m-%d")
         except ValueError:
             logger.warning("Invalid date format: %s", date)
-            return json.dumps({"error": "Invalid date format. Use YYYY-MM-DD"})
+            return to_compact_json({"error": "Invalid date format. Use YYYY-MM-DD"})
 
         # Create transaction
         if category_id == 0:
@@ -259,7 +276,7 @@ def add_manual_transaction(
         # Get the created transaction to return details
         transaction = lunch_client.get_transaction(transaction_id)
 
-        return json.dumps(
+        return to_compact_json(
             {
                 "success": True,
                 "transaction_id": transaction_id,
@@ -277,7 +294,7 @@ def add_manual_transaction(
         )
     except Exception as e:
         logger.exception("Error adding manual transaction")
-        return json.dumps({"error": str(e)})
+        return to_compact_json({"error": str(e)})
 
 
 def get_crypto_accounts_balances(chat_id: int) -> str:
@@ -309,10 +326,31 @@ def get_crypto_accounts_balances(chat_id: int) -> str:
             accounts_data.append(account_info)
 
         logger.info("Successfully processed %d crypto accounts", len(accounts_data))
-        return json.dumps({"crypto_accounts": accounts_data})
+        return to_compact_json({"crypto_accounts": accounts_data})
     except Exception as e:
         logger.exception("Error fetching crypto accounts")
-        return json.dumps({"error": str(e)})
+        return to_compact_json({"error": str(e)})
+
+
+async def get_all_accounts_balances(chat_id: int) -> str:
+    """Get current balances for all accounts (Plaid-managed, manually-managed and crypto) in a single call"""
+    logger.info("Calling get_all_accounts_balances for chat_id: %s", chat_id)
+    # the Lunch Money client is synchronous, so fetch the three account types in parallel threads
+    plaid, manual, crypto = await asyncio.gather(
+        asyncio.to_thread(get_plaid_account_balances, chat_id),
+        asyncio.to_thread(get_manual_accounts_balances, chat_id),
+        asyncio.to_thread(get_crypto_accounts_balances, chat_id),
+    )
+    return to_compact_json({"plaid": json.loads(plaid), "manual": json.loads(manual), "crypto": json.loads(crypto)})
+
+
+async def get_manual_transaction_options(chat_id: int) -> str:
+    """Get the manually-managed accounts and the categories a manual transaction can use, in a single call"""
+    logger.info("Calling get_manual_transaction_options for chat_id: %s", chat_id)
+    manual, categories = await asyncio.gather(
+        asyncio.to_thread(get_manual_accounts_balances, chat_id), asyncio.to_thread(get_categories, chat_id)
+    )
+    return to_compact_json({**json.loads(manual), **json.loads(categories)})
 
 
 def prepare_transaction_update_data(
@@ -422,7 +460,7 @@ def update_transaction(
 
         # Check if preparation returned an error
         if isinstance(update_data, str):
-            return json.dumps({"error": update_data})
+            return to_compact_json({"error": update_data})
 
         # Update the transaction
         logger.info("Updating transaction %s with fields: %s", transaction_id, list(update_data.keys()))
@@ -432,7 +470,7 @@ def update_transaction(
         updated_transaction = lunch_client.get_transaction(transaction_id)
         logger.info("Transaction %s updated successfully", transaction_id)
 
-        return json.dumps(
+        return to_compact_json(
             {
                 "success": True,
                 "transaction_id": transaction_id,
@@ -442,7 +480,7 @@ def update_transaction(
         )
     except Exception as e:
         logger.exception("Error updating transaction %s", transaction_id)
-        return json.dumps({"error": str(e)})
+        return to_compact_json({"error": str(e)})
 
 
 def get_transactions(
@@ -497,7 +535,7 @@ def get_transactions(
                 logger.debug("Parsed start_date: %s", parsed_start_date)
             except ValueError:
                 logger.warning("Invalid start_date format: %s", start_date)
-                return json.dumps({"error": "Invalid start_date format. Use YYYY-MM-DD"})
+                return to_compact_json({"error": "Invalid start_date format. Use YYYY-MM-DD"})
 
         if end_date:
             try:
@@ -505,7 +543,7 @@ def get_transactions(
                 logger.debug("Parsed end_date: %s", parsed_end_date)
             except ValueError:
                 logger.warning("Invalid end_date format: %s", end_date)
-                return json.dumps({"error": "Invalid end_date format. Use YYYY-MM-DD"})
+                return to_compact_json({"error": "Invalid end_date format. Use YYYY-MM-DD"})
 
         # Limit validation
         if limit > MAX_TRANSACTION_LIMIT:
@@ -544,7 +582,7 @@ def get_transactions(
             transactions_data.append(transaction_info)
 
         logger.info("Successfully processed %d transactions", len(transactions_data))
-        return json.dumps(
+        return to_compact_json(
             {
                 "transactions": transactions_data,
                 "count": len(transactions_data),
@@ -562,7 +600,7 @@ def get_transactions(
         )
     except Exception as e:
         logger.exception("Error fetching transactions")
-        return json.dumps({"error": str(e)})
+        return to_compact_json({"error": str(e)})
 
 
 def get_single_transaction(chat_id: int, transaction_id: int) -> str:
@@ -586,10 +624,10 @@ def get_single_transaction(chat_id: int, transaction_id: int) -> str:
 
         transaction_info = transaction_to_dict(transaction)
 
-        return json.dumps({"success": True, "transaction": transaction_info})
+        return to_compact_json({"success": True, "transaction": transaction_info})
     except Exception as e:
         logger.exception("Error fetching transaction %s", transaction_id)
-        return json.dumps({"error": str(e)})
+        return to_compact_json({"error": str(e)})
 
 
 def get_recent_transactions(chat_id: int, days: int = 7, limit: int = 20) -> str:
@@ -626,7 +664,7 @@ def get_recent_transactions(chat_id: int, days: int = 7, limit: int = 20) -> str
             transaction_info = transaction_to_dict(transaction)
             transactions_data.append(transaction_info)
 
-        return json.dumps(
+        return to_compact_json(
             {
                 "success": True,
                 "transactions": transactions_data,
@@ -637,7 +675,11 @@ def get_recent_transactions(chat_id: int, days: int = 7, limit: int = 20) -> str
 
     except Exception as e:
         logger.exception("Error fetching recent transactions")
-        return json.dumps({"error": str(e)})
+        return to_compact_json({"error": str(e)})
+
+
+# Names available to calculate expressions: a few safe functions and no built-ins that could be dangerous
+CALCULATE_NAMESPACE = {"__builtins__": {}, "abs": abs, "round": round, "min": min, "max": max, "pow": pow, "sum": sum}
 
 
 def calculate(expression: str) -> str:
@@ -654,28 +696,22 @@ def calculate(expression: str) -> str:
     """
     logger.info("Calling calculate for expression: %s", expression)
     try:
-        # Define safe functions that can be used in expressions
-        safe_functions = {"abs": abs, "round": round, "min": min, "max": max, "pow": pow, "sum": sum}
-
-        # Define safe names (no built-ins that could be dangerous)
-        safe_names = {"__builtins__": {}, **safe_functions}
-
         logger.info("Evaluating math expression: %r", expression)
         # Evaluate the expression safely
-        result = eval(expression, safe_names, {})
+        result = eval(expression, CALCULATE_NAMESPACE, {})
         logger.info("Expression evaluated successfully: %r = %r", expression, result)
 
-        return json.dumps({"success": True, "expression": expression, "result": result})
+        return to_compact_json({"success": True, "expression": expression, "result": result})
 
     except ZeroDivisionError:
         logger.warning("Division by zero in expression: %r", expression)
-        return json.dumps({"error": "Division by zero"})
+        return to_compact_json({"error": "Division by zero"})
     except (SyntaxError, NameError, TypeError, ValueError) as e:
         logger.warning("Invalid expression %r: %s", expression, str(e))
-        return json.dumps({"error": f"Invalid expression: {e!s}"})
+        return to_compact_json({"error": f"Invalid expression: {e!s}"})
     except Exception as e:
         logger.exception("Error calculating expression %r", expression)
-        return json.dumps({"error": f"Calculation error: {e!s}"})
+        return to_compact_json({"error": f"Calculation error: {e!s}"})
 
 
 def parse_date_reference(date_reference: str) -> str:
@@ -704,7 +740,7 @@ def parse_date_reference(date_reference: str) -> str:
 
         if parsed_datetime is None:
             logger.warning("Failed to parse date reference: %r", date_reference)
-            return json.dumps({"error": f"Could not parse date reference: {date_reference}"})
+            return to_compact_json({"error": f"Could not parse date reference: {date_reference}"})
 
         result_date = parsed_datetime.date()
         logger.info("Successfully parsed date reference %r to %s", date_reference, result_date.isoformat())
@@ -713,7 +749,7 @@ def parse_date_reference(date_reference: str) -> str:
         if days_diff != 0:
             logger.info("Date is %d days %s today", abs(days_diff), "after" if days_diff > 0 else "before")
 
-        return json.dumps(
+        return to_compact_json(
             {
                 "success": True,
                 "date": result_date.strftime("%Y-%m-%d"),
@@ -725,4 +761,4 @@ def parse_date_reference(date_reference: str) -> str:
 
     except Exception as e:
         logger.exception("Error parsing date reference %r", date_reference)
-        return json.dumps({"error": str(e)})
+        return to_compact_json({"error": str(e)})
@@ -16,14 +16,27 @@ from handlers.expectations import AMAZON_EXPORT, clear_expectation, set_expectat
 from lunch import get_lunch_money_token_for_chat_id
 from persistence import get_db
 from telegram_extensions import Update
-from utils import Keyboard
+from utils import Keyboard, on_off
 
 # Constants
 MAX_PREVIEW_UPDATES = 3
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("amz")
 
+PRE_PROCESSING_TEXT_TEMPLATE = dedent(
+    """
+    I got the Amazon export. It contains {total_transactions} transactions from {start_date} to {end_date}.
+
+    Since this is a time-intensive process, I will only process transactions from the last 60 days.
+
+    I can also do a dry run to show you what transactions will be updated, without actually updating them.
+
+    AI categorization will ask an LLM what category best describes the transaction based on what items were purchased.
+
+    AI categorization is {ai_categorization}.
+    """
+)
+
 
 async def handle_amazon_sync(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logger.info("Handling /amazon_sync command")
@@ -87,6 +100,10 @@ def get_process_amazon_tx_buttons(ai_categorization_enabled: bool) -> InlineKeyb
     return kbd.build()
 
 
+# only two variants exist, so build both once instead of on every render
+PROCESS_AMAZON_TX_BUTTONS = {enabled: get_process_amazon_tx_buttons(enabled) for enabled in (False, True)}
+
+
 async def pre_processing_amazon_transactions(
     update: Update, context: ContextTypes.DEFAULT_TYPE, msg_id: int | None = None
 ):
@@ -102,38 +119,24 @@ async def pre_processing_amazon_transactions(
         return
 
     summary = get_amazon_transactions_summary(export_file)
-    if ai_categorization_enabled:
-        ai_categorization_enabled_text = "AI categorization is 🟢 ᴏɴ."
-    else:
-        ai_categorization_enabled_text = "AI categorization is 🔴 ᴏꜰꜰ."
-
-    text = dedent(
-        f"""
-        I got the Amazon export. It contains {summary["total_transactions"]} transactions from {summary["start_date"]} to {summary["end_date"]}.
-
-        Since this is a time-intensive process, I will only process transactions from the last 60 days.
-
-        I can also do a dry run to show you what transactions will be updated, without actually updating them.
-
-        AI categorization will ask an LLM what category best describes the transaction based on what items were purchased.
-
-        {ai_categorization_enabled_text}
-        """
+    text = PRE_PROCESSING_TEXT_TEMPLATE.format(
+        total_transactions=summary["total_transactions"],
+        start_date=summary["start_date"],
+        end_date=summary["end_date"],
+        ai_categorization=on_off(ai_categorization_enabled),
     )
 
     if msg_id and context.bot:
         await context.bot.edit_message_text(
             text=text,
             parse_mode=ParseMode.MARKDOWN,
-            reply_markup=get_process_amazon_tx_buttons(ai_categorization_enabled),
+            reply_markup=PROCESS_AMAZON_TX_BUTTONS[ai_categorization_enabled],
             chat_id=update.chat_id,
             message_id=msg_id,
         )
     elif update.message:
         await update.message.reply_text(
-            text=text,
-            parse_mode=ParseMode.MARKDOWN,
-            reply_markup=get_process_amazon_tx_buttons(ai_categorization_enabled=False),
+            text=text, parse_mode=ParseMode.MARKDOWN, reply_markup=PROCESS_AMAZON_TX_BUTTONS[False]
         )
 
 
@@ -303,7 +306,7 @@ async def handle_preview_process_amazon_transactions(update: Update, context: Co
 
         lunch_money_token = get_lunch_money_token_for_chat_id(update.chat_id)
 
-        result = process_amazon_transactions(
+        result = await process_amazon_transactions(
             file_path=export_file,
             days_back=60,
             dry_run=True,
@@ -413,7 +416,7 @@ async def handle_process_amazon_transactions(update: Update, context: ContextTyp
 
         lunch_money_token = get_lunch_money_token_for_chat_id(update.chat_id)
 
-        result = process_amazon_transactions(
+        result = await process_amazon_transactions(
             file_path=export_file,
             days_back=60,
             dry_run=False,
@@ -10,6 +10,8 @@ from utils import Keyboard, is_admin_user
 
 logger = logging.getLogger(__name__)
 
+CLOSE_BUTTONS = Keyboard.build_from(("Close", "cancel"))
+
 
 async def is_authorized(update: Update) -> bool:
     """Check if user is authorized to use admin commands."""
@@ -86,9 +88,7 @@ async def handle_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = format_metrics_message(all_metrics, has_data)
 
     if update.message:
-        await update.message.reply_text(
-            text=message, parse_mode=ParseMode.MARKDOWN, reply_markup=Keyboard().build_from(("Close", "cancel"))
-        )
+        await update.message.reply_text(text=message, parse_mode=ParseMode.MARKDOWN, reply_markup=CLOSE_BUTTONS)
 
 
 async def handle_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -110,4 +110,4 @@ async def handle_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
     if update.message:
-        await update.message.reply_text(text=message, reply_markup=Keyboard().build_from(("Close", "cancel")))
+        await update.message.reply_text(text=message, reply_markup=CLOSE_BUTTONS)
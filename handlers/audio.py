@@ -3,16 +3,25 @@ import os
 import time
 from tempfile import NamedTemporaryFile
 
-import requests
+import httpx
 from telegram.constants import ParseMode, ReactionEmoji
 from telegram.ext import ContextTypes
 
-from handlers.ai_agent import get_agent_response, handle_ai_response
+from handlers.ai_agent import AgentStatusReporter, get_agent_response, handle_ai_response
 from persistence import get_db
-from telegram_extensions import Update
+from telegram_extensions import Update, is_markdown_parse_error
+from utils import escape_markdown_v2
 
 logger = logging.getLogger("handlers.audio")
 
+DEEPINFRA_WHISPER_URL = "https://api.deepinfra.com/v1/inference/openai/whisper-large-v3"
+
+# Shared across requests so consecutive transcriptions reuse the keep-alive connection
+# to DeepInfra instead of paying for a new TCP + TLS handshake every time
+deepinfra_client = httpx.AsyncClient(
+    timeout=httpx.Timeout(120.0, connect=10.0), limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
+)
+
 
 async def handle_audio_transcription(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
     """
@@ -32,8 +41,9 @@ async def handle_audio_transcription(update: Update, context: ContextTypes.DEFAU
 
     chat_id = update.chat_id
 
+    db = get_db()
     # Check if AI agent is enabled for this chat
-    settings = get_db().get_current_settings(chat_id)
+    settings = db.get_current_settings(chat_id)
     ai_agent = settings.ai_agent if settings else False
 
     if not ai_agent:
@@ -60,41 +70,44 @@ async def handle_audio_transcription(update: Update, context: ContextTypes.DEFAU
         chat_id=chat_id, message_id=message.message_id, reaction=ReactionEmoji.HIGH_VOLTAGE_SIGN
     )
 
-    get_db().inc_metric("audio_processing_requests")
+    db.inc_metric("audio_processing_requests")
 
     try:
         # Process audio transcription
         transcription = await _process_audio_transcription(update, context, audio_file, settings)
 
         if not transcription:
-            get_db().inc_metric("audio_processing_failed")
+            db.inc_metric("audio_processing_failed")
             await context.bot.send_message(chat_id=chat_id, text="Failed to transcribe audio")
             return False
 
         # Track transcription metrics
-        get_db().inc_metric("audio_transcription_successful")
-        get_db().inc_metric("audio_transcription_chars", len(transcription))
+        db.inc_metric("audio_transcription_successful")
+        db.inc_metric("audio_transcription_chars", len(transcription))
 
         # try to see if the message is a reply to a transaction message
         tx_id = None
         replying_to_msg_id = None
         if message.reply_to_message:
             replying_to_msg_id = message.reply_to_message.message_id
-            tx_id = get_db().get_tx_associated_with(replying_to_msg_id, message.chat_id)
+            tx_id = db.get_tx_associated_with(replying_to_msg_id, message.chat_id)
 
         # Process the transcription with AI
-        ai_response = get_agent_response(transcription, chat_id, tx_id, replying_to_msg_id, verbose=True)
-        await handle_ai_response(update, context, ai_response)
+        status_reporter = AgentStatusReporter(message)
+        ai_response = await get_agent_response(
+            transcription, chat_id, tx_id, replying_to_msg_id, verbose=True, on_status=status_reporter.update
+        )
+        await handle_ai_response(update, context, ai_response, status_reporter.status_message)
 
     except Exception as e:
         logger.exception("Error processing audio file")
-        get_db().inc_metric("audio_processing_failed")
+        db.inc_metric("audio_processing_failed")
         await context.bot.send_message(chat_id=chat_id, text=f"Error processing audio: {e!s}")
 
         return False
     else:
         # Track successful end-to-end processing
-        get_db().inc_metric("audio_processing_successful")
+        db.inc_metric("audio_processing_successful")
         return True
 
 
@@ -123,7 +136,8 @@ async def _process_audio_transcription(
 
     # Track audio file size
     file_size = getattr(audio_file, "file_size", 0) or 0
-    get_db().inc_metric("audio_file_size_bytes", file_size)
+    db = get_db()
+    db.inc_metric("audio_file_size_bytes", file_size)
 
     # Save to a temporary file
     with NamedTemporaryFile(delete=False, suffix=".ogg") as temp_file:
@@ -132,20 +146,20 @@ async def _process_audio_transcription(
 
     # Transcribe the audio
     transcription_start = time.time()
-    transcription, _language = transcribe_audio(temp_path)
+    transcription, _language = await transcribe_audio(temp_path)
     transcription_time = time.time() - transcription_start
-    get_db().inc_metric("audio_transcription_time_seconds", transcription_time)
+    db.inc_metric("audio_transcription_time_seconds", transcription_time)
 
     # Send the transcription to the user if enabled in settings
     if settings.show_transcription:
         try:
             await context.bot.send_message(
                 chat_id=chat_id,
-                text=f"I will process now the following transcription:\n> {transcription.replace('.', '\\.')}",
+                text=f"I will process now the following transcription:\n> {escape_markdown_v2(transcription)}",
                 parse_mode=ParseMode.MARKDOWN_V2,
             )
         except Exception as se:
-            if "Can't parse entities" in str(se):
+            if is_markdown_parse_error(se):
                 # try to send without markdown
                 await context.bot.send_message(
                     chat_id=chat_id, text=f"I will process now the following transcription:\n{transcription}"
@@ -157,7 +171,7 @@ async def _process_audio_transcription(
     return transcription
 
 
-def transcribe_audio(file_path: str) -> tuple[str, str]:
+async def transcribe_audio(file_path: str) -> tuple[str, str]:
     """
     Transcribe an audio file using DeepInfra's Whisper API.
 
@@ -167,7 +181,6 @@ def transcribe_audio(file_path: str) -> tuple[str, str]:
     Returns:
         A tuple containing the transcription text and detected language
     """
-    url = "https://api.deepinfra.com/v1/inference/openai/whisper-large-v3"
     api_key = os.getenv("DEEPINFRA_API_KEY")
 
     if not api_key:
@@ -177,13 +190,14 @@ def transcribe_audio(file_path: str) -> tuple[str, str]:
 
     logger.info(f"Sending audio file {file_path} to DeepInfra for transcription")
 
+    db = get_db()
     try:
         with open(file_path, "rb") as audio_file:
             files = {"audio": audio_file}
-            response = requests.post(url, headers=headers, files=files)
+            response = await deepinfra_client.post(DEEPINFRA_WHISPER_URL, headers=headers, files=files)
 
         # Track DeepInfra usage metrics
-        get_db().inc_metric("deepinfra_whisper_requests")
+        db.inc_metric("deepinfra_whisper_requests")
 
         if response.status_code == 200:  # noqa: PLR2004
             response_json = response.json()
@@ -195,22 +209,22 @@ def transcribe_audio(file_path: str) -> tuple[str, str]:
             # Track cost if available
             if "inference_status" in response_json and "cost" in response_json["inference_status"]:
                 cost = response_json["inference_status"]["cost"]
-                get_db().inc_metric("deepinfra_whisper_estimated_cost", cost)
+                db.inc_metric("deepinfra_whisper_estimated_cost", cost)
 
             # Track language detection
             if language:
-                get_db().inc_metric(f"audio_language_{language.lower()}")
+                db.inc_metric(f"audio_language_{language.lower()}")
 
             logger.info(f"Transcription successful: {transcription}")
             logger.info(f"Detected language: {language}")
 
             return transcription, language
         else:
-            get_db().inc_metric("deepinfra_whisper_requests_failed")
+            db.inc_metric("deepinfra_whisper_requests_failed")
             logger.exception(f"Transcription failed with status code: {response.status_code}")
             response.raise_for_status()
             return "", ""
     except Exception:
-        get_db().inc_metric("deepinfra_whisper_requests_failed")
+        db.inc_metric("deepinfra_whisper_requests_failed")
         logger.exception("Error during transcription")
         raise
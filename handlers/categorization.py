@@ -12,7 +12,7 @@ from tx_messaging import send_transaction_message
 logger = logging.getLogger("categorization")
 
 
-def categorize_transaction_with_agent(tx_id: int, chat_id: int) -> str:
+async def categorize_transaction_with_agent(tx_id: int, chat_id: int) -> str:
     """
     Categorize a transaction using the DSPy agent.
 
@@ -32,6 +32,7 @@ def categorize_transaction_with_agent(tx_id: int, chat_id: int) -> str:
     """
     logger.info("Starting agent-based categorization for tx_id=%s, chat_id=%s", tx_id, chat_id)
 
+    db = get_db()
     try:
         # Fetch the transaction
         lunch = get_lunch_client_for_chat_id(chat_id)
@@ -50,10 +51,9 @@ def categorize_transaction_with_agent(tx_id: int, chat_id: int) -> str:
             4. After determining the category, update the transaction using the update_transaction tool
 
             Please:
-            1. First, get the transaction details using get_single_transaction
-            2. Then, get available categories using get_categories
-            3. Analyze the transaction and choose the best matching category
-            4. Update the transaction with the chosen category using update_transaction
+            1. Get available categories using get_categories
+            2. Analyze the transaction details you were given and choose the best matching category
+            3. Update the transaction with the chosen category using update_transaction
 
             Respond with a brief message indicating which category was applied.
             """
@@ -62,10 +62,10 @@ def categorize_transaction_with_agent(tx_id: int, chat_id: int) -> str:
         logger.info("Calling agent with categorization prompt")
 
         # Get the telegram message ID if available for context
-        telegram_message_id = get_db().get_message_id_associated_with(tx_id, chat_id)
+        telegram_message_id = db.get_message_id_associated_with(tx_id, chat_id)
 
         # Call the agent
-        response = get_agent_response(
+        response = await get_agent_response(
             user_prompt=prompt, chat_id=chat_id, tx_id=tx_id, telegram_message_id=telegram_message_id, verbose=False
         )
 
@@ -78,7 +78,7 @@ def categorize_transaction_with_agent(tx_id: int, chat_id: int) -> str:
             logger.info("Transaction updated successfully. New category: %s", updated_tx.category_name)
 
             # Check if we need to mark as reviewed
-            settings = get_db().get_current_settings(chat_id)
+            settings = db.get_current_settings(chat_id)
             if settings and settings.mark_reviewed_after_categorized and updated_tx.status != "cleared":
                 logger.info("Marking transaction as reviewed per user settings")
                 lunch.update_transaction(tx_id, TransactionUpdateObject(status="cleared"))  # type: ignore
@@ -101,7 +101,7 @@ def categorize_transaction_with_agent(tx_id: int, chat_id: int) -> str:
 
 
 async def ai_categorize_transaction(tx_id: int, chat_id: int, context: ContextTypes.DEFAULT_TYPE):
-    response = categorize_transaction_with_agent(tx_id, chat_id)
+    response = await categorize_transaction_with_agent(tx_id, chat_id)
     logger.info(f"AI-categorization response: {response}")
 
     # update the transaction message to show the new categories
@@ -10,7 +10,6 @@ AMAZON_EXPORT = "amazon_export"
 expectations: dict[int, dict[str, str] | None] = {}
 
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("expectations")
 
 
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import os
 import traceback
@@ -111,8 +112,9 @@ async def handle_generic_message(update: Update, context: ContextTypes.DEFAULT_T
 
     settings = get_db().get_current_settings(chat_id)
     if settings is not None and settings.ai_agent:
-        # If AI Agent is enabled, we just pass the message to the AI handler
-        await handle_generic_message_with_ai(update, context)
+        # If AI Agent is enabled, we just pass the message to the AI handler. The agent takes
+        # seconds, so it runs in the background instead of holding up every other update.
+        context.application.create_task(handle_generic_message_with_ai(update, context), update=update)
         return True
 
     # These are disabled when AI Agent is enabled
@@ -205,32 +207,38 @@ async def handle_timezone_setting(update: Update, context: ContextTypes.DEFAULT_
     if not update.message or not update.message.text:
         return False
 
-    await context.bot.delete_message(chat_id=update.chat_id, message_id=update.message.message_id)
+    # the user's message is deleted while the reply is sent, nothing depends on it. The deletion is
+    # only started right before each reply, so an error while saving never leaves it dangling.
+    def delete_user_message():
+        return context.bot.delete_message(chat_id=update.chat_id, message_id=update.message.message_id)
 
     # validate the time zone
-    if update.message.text not in pytz.all_timezones:
-        await context.bot.send_message(
-            chat_id=update.chat_id,
-            text=f"`{update.message.text}` is an invalid timezone. Please try again.",
-            parse_mode=ParseMode.MARKDOWN,
+    if update.message.text not in pytz.all_timezones_set:
+        await asyncio.gather(
+            delete_user_message(),
+            context.bot.send_message(
+                chat_id=update.chat_id,
+                text=f"`{update.message.text}` is an invalid timezone. Please try again.",
+                parse_mode=ParseMode.MARKDOWN,
+            ),
         )
         return True
 
     clear_expectation(update.chat_id)
 
     # save the time zone
-    get_db().update_timezone(update.chat_id, update.message.text)
+    settings = get_db().update_timezone(update.chat_id, update.message.text)
 
-    settings = get_db().get_current_settings(update.chat_id)
-    schedule_text = get_schedule_rendering_text(update.chat_id)
-    if schedule_text:
-        await context.bot.edit_message_text(
+    await asyncio.gather(
+        delete_user_message(),
+        context.bot.edit_message_text(
             message_id=int(expectation["msg_id"]),
-            text=schedule_text,
+            text=get_schedule_rendering_text(settings),
             chat_id=update.chat_id,
             reply_markup=get_schedule_rendering_buttons(settings),
             parse_mode=ParseMode.MARKDOWN_V2,
-        )
+        ),
+    )
     return True
 
 
@@ -240,11 +248,8 @@ async def handle_set_tags(update: Update, context: ContextTypes.DEFAULT_TYPE, ex
         return False
 
     # make sure they look like tags
-    message_are_tags = True
-    for word in update.message.text.split(" "):
-        if not word.startswith("#"):
-            message_are_tags = False
-            break
+    words = update.message.text.split(" ")
+    message_are_tags = all(word.startswith("#") for word in words)
 
     if not message_are_tags:
         await context.bot.send_message(
@@ -265,7 +270,7 @@ async def handle_set_tags(update: Update, context: ContextTypes.DEFAULT_TYPE, ex
     lunch = get_lunch_client_for_chat_id(update.chat_id)
     transaction_id = int(expectation["transaction_id"])
 
-    tags_without_hashtag = [tag[1:] for tag in update.message.text.split(" ") if tag.startswith("#")]
+    tags_without_hashtag = [tag[1:] for tag in words]
     logger.info(f"Setting tags to transaction ({transaction_id}): {tags_without_hashtag}")
     lunch.update_transaction(transaction_id, TransactionUpdateObject(tags=tags_without_hashtag))  # type: ignore
 
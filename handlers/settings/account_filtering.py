@@ -1,7 +1,12 @@
+import asyncio
 import logging
+import time
+from functools import lru_cache
 from textwrap import dedent
 
+from lunchable import LunchMoney
 from lunchable.exceptions import LunchMoneyError
+from lunchable.models import PlaidAccountObject
 from telegram import InlineKeyboardMarkup
 from telegram.constants import ParseMode
 from telegram.ext import ContextTypes
@@ -14,144 +19,191 @@ from utils import Keyboard
 
 logger = logging.getLogger("account_filtering")
 
+# Plaid accounts change on the order of days, while rendering this menu needs them twice per
+# tap (text and buttons), so they are kept for a short while per chat
+PLAID_ACCOUNTS_CACHE_TTL_SECS = 120
 
-def get_account_filtering_text(chat_id: int) -> str:
-    """Render menu with account list and ignore status."""
-    try:
-        # Get user's Plaid accounts from Lunch Money API (only these have transactions)
-        lunch_client = get_lunch_client_for_chat_id(chat_id)
-        accounts = lunch_client.get_plaid_accounts()
+# chat_id -> (client the accounts were fetched with, expires_at, (account_id, account_name) pairs).
+# Keeping the client means a new token (re-login with another account) never gets the old accounts.
+plaid_accounts_cache: dict[int, tuple[LunchMoney, float, tuple[tuple[int, str], ...]]] = {}
 
-        logger.info(f"Successfully fetched {len(accounts)} accounts for chat {chat_id}")
+IGNORED_ACCOUNT_PREFIX = "🔕 "
+NOTIFIED_ACCOUNT_PREFIX = "🔔 "
 
-        # Get ignored accounts from database
-        ignored_accounts = get_db().get_ignored_accounts_list(chat_id)
-        ignored_set = set(ignored_accounts)
+NO_ACCOUNTS_TEXT = dedent(
+    """
+    🛠️ 🆂🅴🆃🆃🅸🅽🅶🆂 \\- *Account Filtering*
 
-        # Filter out any ignored accounts that no longer exist (account deletion scenario)
-        valid_account_ids = {acc.id for acc in accounts}
-        stale_ignored_accounts = [acc_id for acc_id in ignored_accounts if acc_id not in valid_account_ids]
+    ❌ No accounts available to configure\\.
 
-        if stale_ignored_accounts:
-            logger.warning(
-                f"Found {len(stale_ignored_accounts)} stale ignored account IDs for chat {chat_id}: {stale_ignored_accounts}"
-            )
-            # Remove stale account IDs from ignored list
-            cleaned_ignored_accounts = [acc_id for acc_id in ignored_accounts if acc_id in valid_account_ids]
-            get_db().update_ignored_accounts(chat_id, cleaned_ignored_accounts)
-            ignored_set = set(cleaned_ignored_accounts)
-            logger.info(f"Cleaned up stale ignored accounts for chat {chat_id}")
+    Please ensure your Lunch Money account has connected Plaid accounts\\.
+    """
+)
 
-        if not accounts:
-            logger.warning(f"No Plaid accounts found for chat {chat_id}")
-            return dedent(
-                """
-                🛠️ 🆂🅴🆃🆃🅸🅽🅶🆂 \\- *Account Filtering*
+SUMMARY_TEXT_TEMPLATE = dedent(
+    """
+    🛠️ 🆂🅴🆃🆃🅸🅽🅶🆂 \\- *Account Filtering*
 
-                ❌ No accounts available to configure\\.
+    Configure which accounts should be ignored for transaction notifications\\.
 
-                Please ensure your Lunch Money account has connected Plaid accounts\\.
-                """
-            )
+    📊 *Summary*: {ignored_count} of {total_count} accounts ignored
 
-        # Count ignored accounts
-        ignored_count = len([acc for acc in accounts if acc.id in ignored_set])
-        total_count = len(accounts)
+    Tap an account below to toggle its notification status\\.
+    """
+)
 
-        return dedent(
-            f"""
-            🛠️ 🆂🅴🆃🆃🅸🅽🅶🆂 \\- *Account Filtering*
+NO_TOKEN_TEXT = dedent(
+    """
+    🛠️ 🆂🅴🆃🆃🅸🅽🅶🆂 \\- *Account Filtering*
 
-            Configure which accounts should be ignored for transaction notifications\\.
+    ❌ Lunch Money token not found\\.
 
-            📊 *Summary*: {ignored_count} of {total_count} accounts ignored
+    Please set up your Lunch Money connection first in Settings → Session\\.
+    """
+)
 
-            Tap an account below to toggle its notification status\\.
-            """
-        )
+API_ERROR_TEXT = dedent(
+    """
+    🛠️ 🆂🅴🆃🆃🅸🅽🅶🆂 \\- *Account Filtering*
 
-    except NoLunchTokenError:
-        logger.exception(f"No Lunch Money token found for chat {chat_id}")
-        return dedent(
-            """
-            🛠️ 🆂🅴🆃🆃🅸🅽🅶🆂 \\- *Account Filtering*
+    ❌ Error connecting to Lunch Money API\\.
 
-            ❌ Lunch Money token not found\\.
+    Please check your connection and try again\\. If the problem persists, your token may need to be refreshed\\.
+    """
+)
 
-            Please set up your Lunch Money connection first in Settings → Session\\.
-            """
-        )
-    except LunchMoneyError:
-        logger.exception(f"Lunch Money API error for chat {chat_id}")
-        return dedent(
-            """
-            🛠️ 🆂🅴🆃🆃🅸🅽🅶🆂 \\- *Account Filtering*
+UNEXPECTED_ERROR_TEXT = dedent(
+    """
+    🛠️ 🆂🅴🆃🆃🅸🅽🅶🆂 \\- *Account Filtering*
 
-            ❌ Error connecting to Lunch Money API\\.
+    ❌ Unexpected error loading accounts\\.
 
-            Please check your connection and try again\\. If the problem persists, your token may need to be refreshed\\.
-            """
-        )
-    except Exception:
-        logger.exception(f"Unexpected error fetching accounts for filtering menu for chat {chat_id}")
-        return dedent(
-            """
-            🛠️ 🆂🅴🆃🆃🅸🅽🅶🆂 \\- *Account Filtering*
+    Please try again later\\. If the problem persists, please contact support\\.
+    """
+)
 
-            ❌ Unexpected error loading accounts\\.
 
-            Please try again later\\. If the problem persists, please contact support\\.
-            """
-        )
+def get_account_name(account: PlaidAccountObject) -> str:
+    """Returns the account's display_name if available, otherwise its name.
+
+    PlaidAccountObject does not declare display_name, it's only there when the API sends it
+    (the model allows extra fields).
+    """
+    return getattr(account, "display_name", None) or account.name
+
+
+def get_plaid_accounts(chat_id: int) -> tuple[tuple[int, str], ...]:
+    """Returns the chat's Plaid accounts as (account_id, account_name) pairs, fetching them when not cached.
+
+    Names are resolved once per fetch instead of on every render of the menu.
+    """
+    lunch_client = get_lunch_client_for_chat_id(chat_id)
+    cached = plaid_accounts_cache.get(chat_id)
+    if cached is not None and cached[0] is lunch_client and cached[1] > time.monotonic():
+        return cached[2]
+
+    accounts = tuple((account.id, get_account_name(account)) for account in lunch_client.get_plaid_accounts())
+    plaid_accounts_cache[chat_id] = (lunch_client, time.monotonic() + PLAID_ACCOUNTS_CACHE_TTL_SECS, accounts)
+    return accounts
+
 
+def invalidate_plaid_accounts(chat_id: int) -> None:
+    """Drops the chat's cached Plaid accounts, e.g. after a Plaid refresh or a logout."""
+    plaid_accounts_cache.pop(chat_id, None)
 
-def get_account_filtering_buttons(chat_id: int) -> InlineKeyboardMarkup:
-    """Create toggle buttons for each account."""
+
+def get_account_filtering_text(accounts: tuple[tuple[int, str], ...], ignored_set: set[int]) -> str:
+    """Render menu summary with the number of ignored accounts."""
+    if not accounts:
+        return NO_ACCOUNTS_TEXT
+
+    # Stale IDs are dropped before rendering, so every ignored ID belongs to one of the accounts
+    return SUMMARY_TEXT_TEMPLATE.format_map({"ignored_count": len(ignored_set), "total_count": len(accounts)})
+
+
+def get_back_buttons() -> InlineKeyboardMarkup:
     kbd = Keyboard()
+    kbd += ("Back", "transactionsHandlingSettings")
+    return kbd.build()
+
+
+# Minimal keyboard shown when the accounts could not be loaded
+BACK_BUTTONS = get_back_buttons()
+
+
+def get_account_button(account_id: int, account_name: str, ignored_set: frozenset[int]) -> tuple[str, str]:
+    ignored = account_id in ignored_set
+    status_prefix = IGNORED_ACCOUNT_PREFIX if ignored else NOTIFIED_ACCOUNT_PREFIX
+    # the button carries the state it was rendered with, see handle_btn_toggle_account_ignore
+    return status_prefix + account_name, f"toggleAccountIgnore_{account_id}_{ignored}"
 
+
+# Keyed by the accounts and the ignored ones, so re-opening the menu or toggling an account
+# back and forth reuses the keyboard instead of rebuilding a button per account
+@lru_cache(maxsize=64)
+def build_account_filtering_buttons(
+    accounts: tuple[tuple[int, str], ...], ignored_set: frozenset[int]
+) -> InlineKeyboardMarkup:
+    kbd = Keyboard(get_account_button(account_id, account_name, ignored_set) for account_id, account_name in accounts)
+    kbd += ("Back", "transactionsHandlingSettings")
+    return kbd.build(columns=1)
+
+
+def render_account_filtering_menu(chat_id: int) -> tuple[str, InlineKeyboardMarkup]:
+    """Render the menu's text and buttons, fetching the accounts and ignored accounts only once."""
+    db = get_db()
     try:
         # Get user's Plaid accounts from Lunch Money API (only these have transactions)
-        lunch_client = get_lunch_client_for_chat_id(chat_id)
-        accounts = lunch_client.get_plaid_accounts()
+        accounts = get_plaid_accounts(chat_id)
+
+        logger.info(f"Successfully fetched {len(accounts)} accounts for chat {chat_id}")
 
         # Get ignored accounts from database
-        ignored_accounts = get_db().get_ignored_accounts_list(chat_id)
-        ignored_set = set(ignored_accounts)
+        ignored_set = db.get_ignored_accounts_set(chat_id)
 
-        # Create toggle buttons for each account
-        for account in accounts:
-            status_icon = "🔕" if account.id in ignored_set else "🔔"
+        valid_account_ids = {account_id for account_id, _ in accounts}
 
-            # Get account name - use display_name if available, otherwise name
-            account_name = getattr(account, "display_name", None) or account.name
+        # Filter out any ignored accounts that no longer exist (account deletion scenario)
+        stale_ignored_accounts = ignored_set - valid_account_ids
 
-            button_text = f"{status_icon} {account_name}"
-            callback_data = f"toggleAccountIgnore_{account.id}"
-            kbd += (button_text, callback_data)
+        if stale_ignored_accounts:
+            logger.warning(
+                f"Found {len(stale_ignored_accounts)} stale ignored account IDs for chat {chat_id}: {stale_ignored_accounts}"
+            )
+            # Remove stale account IDs from ignored set
+            ignored_set -= stale_ignored_accounts
+            db.update_ignored_accounts(chat_id, ignored_set)
+            logger.info(f"Cleaned up stale ignored accounts for chat {chat_id}")
 
-        # Add back button
-        kbd += ("Back", "transactionsHandlingSettings")
+        if not accounts:
+            logger.warning(f"No Plaid accounts found for chat {chat_id}")
 
-        return kbd.build(columns=1)
+        return (
+            get_account_filtering_text(accounts, ignored_set),
+            build_account_filtering_buttons(accounts, frozenset(ignored_set)),
+        )
 
+    except NoLunchTokenError:
+        logger.exception(f"No Lunch Money token found for chat {chat_id}")
+        return NO_TOKEN_TEXT, BACK_BUTTONS
+    except LunchMoneyError:
+        logger.exception(f"Lunch Money API error for chat {chat_id}")
+        return API_ERROR_TEXT, BACK_BUTTONS
     except Exception:
-        logger.exception("Error creating account filtering buttons")
-        # Return minimal keyboard with just back button on error
-        kbd += ("Back", "transactionsHandlingSettings")
-        return kbd.build()
+        logger.exception(f"Unexpected error fetching accounts for filtering menu for chat {chat_id}")
+        return UNEXPECTED_ERROR_TEXT, BACK_BUTTONS
 
 
 async def handle_account_filtering_settings(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Main menu handler for account filtering settings."""
-    await update.safe_edit_message_text(
-        text=get_account_filtering_text(update.chat_id),
-        reply_markup=get_account_filtering_buttons(update.chat_id),
-        parse_mode=ParseMode.MARKDOWN_V2,
-    )
+    # fetching the accounts is a blocking HTTP call, so the menu is rendered off the event loop
+    text, reply_markup = await asyncio.to_thread(render_account_filtering_menu, update.chat_id)
+    await update.safe_edit_message_text(text=text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN_V2)
 
 
 async def handle_btn_toggle_account_ignore(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Toggle handler for individual accounts."""
+    db = get_db()
     try:
         # Extract account ID from callback data
         callback_data = update.callback_query.data
@@ -159,35 +211,28 @@ async def handle_btn_toggle_account_ignore(update: Update, context: ContextTypes
             logger.error(f"Invalid callback data: {callback_data}")
             return
 
-        account_id_str = callback_data.replace("toggleAccountIgnore_", "")
+        # Buttons rendered before the state was added to the callback data only carry the account ID
+        account_id_str, _, rendered_ignored = callback_data.removeprefix("toggleAccountIgnore_").partition("_")
         try:
             account_id = int(account_id_str)
         except ValueError:
             logger.exception(f"Invalid account ID in callback data: {account_id_str}")
             return
 
-        # Get current ignored accounts
-        ignored_accounts = get_db().get_ignored_accounts_list(update.chat_id)
-
-        # Toggle the account's ignore status
-        if account_id in ignored_accounts:
-            # Remove from ignored list
-            ignored_accounts.remove(account_id)
+        # When the button's state is outdated, an earlier tap (e.g. a double tap) already toggled the
+        # account; toggling it again would undo it, so the menu is only redrawn with the current state
+        if rendered_ignored and rendered_ignored != str(account_id in db.get_ignored_accounts_set(update.chat_id)):
+            logger.info(f"Skipped stale toggle of account {account_id} for chat {update.chat_id}")
         else:
-            # Add to ignored list
-            ignored_accounts.append(account_id)
-
-        # Update database
-        get_db().update_ignored_accounts(update.chat_id, ignored_accounts)
+            # Toggle the account's ignore status
+            db.toggle_ignored_account(update.chat_id, account_id)
 
-        logger.info(f"Toggled account {account_id} ignore status for chat {update.chat_id}")
+            logger.info(f"Toggled account {account_id} ignore status for chat {update.chat_id}")
 
     except Exception:
         logger.exception("Error toggling account ignore status")
 
     # Update UI to reflect changes
-    await update.safe_edit_message_text(
-        text=get_account_filtering_text(update.chat_id),
-        reply_markup=get_account_filtering_buttons(update.chat_id),
-        parse_mode=ParseMode.MARKDOWN_V2,
-    )
+    # fetching the accounts is a blocking HTTP call, so the menu is rendered off the event loop
+    text, reply_markup = await asyncio.to_thread(render_account_filtering_menu, update.chat_id)
+    await update.safe_edit_message_text(text=text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN_V2)
@@ -1,42 +1,57 @@
 import os
+from functools import lru_cache
 from textwrap import dedent
 
 from telegram import InlineKeyboardMarkup
 from telegram.constants import ParseMode
 from telegram.ext import ContextTypes
 
-from persistence import get_db
+from persistence import Settings, get_db
 from telegram_extensions import Update
-from utils import Keyboard
+from utils import Keyboard, escape_markdown_v2, on_off
 
+AI_SETTINGS_TEXT_TEMPLATE = dedent(
+    """
+    🤖 🆂🅴🆃🆃🅸🅽🅶🆂 \\- *AI Settings*
 
-def get_ai_settings_text(chat_id: int) -> str | None:
-    settings = get_db().get_current_settings(chat_id)
-    if settings is None:
-        return None
+    ➊ *AI Agent*: {ai_agent}
+    > When enabled, messages \\(including voice messages\\) will be processed by an AI agent\\.
+    >
+    > The agent is able to use the Lunch Money API to inspect transactions, accounts, and create transactions in manually\\-managed accounts\\.
+    >
+    > Replying to a transaction message will make the agent work on that transactions, e\\.g\\. adding notes, tags, recategorizing it, etc\\.
 
-    model_display = os.getenv("AI_MODEL", "anthropic/claude-haiku-4.5").replace(".", "\\.").replace("-", "\\-")
+    2️⃣ *Show Transcription*: {show_transcription}
+    > When enabled, the transcription of audio messages will be shown before processing\\.
 
-    return dedent(
-        f"""
-        🤖 🆂🅴🆃🆃🅸🅽🅶🆂 \\- *AI Settings*
+    3️⃣ *Response Language*: {response_language}
+    > Sets the language for AI agent responses\\. When set to auto\\-detect, the agent will respond in the same language as your input\\.
 
-        ➊ *AI Agent*: {"🟢 ᴏɴ" if settings.ai_agent else "🔴 ᴏꜰꜰ"}
-        > When enabled, messages \\(including voice messages\\) will be processed by an AI agent\\.
-        >
-        > The agent is able to use the Lunch Money API to inspect transactions, accounts, and create transactions in manually\\-managed accounts\\.
-        >
-        > Replying to a transaction message will make the agent work on that transactions, e\\.g\\. adding notes, tags, recategorizing it, etc\\.
+    4️⃣ *AI Model*: {model}
+    > The AI model is configured by the server administrator and cannot be changed from here\\.
+    """
+)
 
-        2️⃣ *Show Transcription*: {"🟢 ᴏɴ" if settings.show_transcription else "🔴 ᴏꜰꜰ"}
-        > When enabled, the transcription of audio messages will be shown before processing\\.
 
-        3️⃣ *Response Language*: {settings.ai_response_language or "🌐 Auto\\-detect"}
-        > Sets the language for AI agent responses\\. When set to auto\\-detect, the agent will respond in the same language as your input\\.
+@lru_cache(maxsize=1)
+def get_model_display_name() -> str:
+    """The configured AI_MODEL, escaped for MarkdownV2 so it can go straight into the settings text."""
+    return escape_markdown_v2(os.getenv("AI_MODEL", "anthropic/claude-haiku-4.5"))
 
-        4️⃣ *AI Model*: {model_display}
-        > The AI model is configured by the server administrator and cannot be changed from here\\.
-        """
+
+def get_ai_settings_text(settings: Settings) -> str:
+    return build_ai_settings_text(settings.ai_agent, settings.show_transcription, settings.ai_response_language)
+
+
+@lru_cache(maxsize=32)
+def build_ai_settings_text(ai_agent: bool, show_transcription: bool, ai_response_language: str | None) -> str:
+    return AI_SETTINGS_TEXT_TEMPLATE.format_map(
+        {
+            "ai_agent": on_off(ai_agent),
+            "show_transcription": on_off(show_transcription),
+            "response_language": ai_response_language or "🌐 Auto\\-detect",
+            "model": get_model_display_name(),
+        }
     )
 
 
@@ -49,41 +64,29 @@ def get_ai_settings_buttons() -> InlineKeyboardMarkup:
     return kbd.build()
 
 
-async def handle_ai_settings(update: Update, _: ContextTypes.DEFAULT_TYPE):
-    settings_text = get_ai_settings_text(update.chat_id)
-    if settings_text is None:
-        return
+AI_SETTINGS_BUTTONS = get_ai_settings_buttons()
+
 
+async def handle_ai_settings(update: Update, _: ContextTypes.DEFAULT_TYPE):
+    settings = get_db().get_current_settings(update.chat_id)
     await update.safe_edit_message_text(
-        text=settings_text, reply_markup=get_ai_settings_buttons(), parse_mode=ParseMode.MARKDOWN_V2
+        text=get_ai_settings_text(settings), reply_markup=AI_SETTINGS_BUTTONS, parse_mode=ParseMode.MARKDOWN_V2
     )
 
 
 async def handle_btn_toggle_ai_agent(update: Update, _: ContextTypes.DEFAULT_TYPE):
-    settings = get_db().get_current_settings(update.chat_id)
-    get_db().update_ai_agent(update.chat_id, not settings.ai_agent)
-
-    # Get updated settings for the button display
-    settings_text = get_ai_settings_text(update.chat_id)
-    if settings_text is None:
-        return
+    settings = get_db().toggle_ai_agent(update.chat_id)
 
     await update.safe_edit_message_text(
-        text=settings_text, reply_markup=get_ai_settings_buttons(), parse_mode=ParseMode.MARKDOWN_V2
+        text=get_ai_settings_text(settings), reply_markup=AI_SETTINGS_BUTTONS, parse_mode=ParseMode.MARKDOWN_V2
     )
 
 
 async def handle_btn_toggle_show_transcription(update: Update, _: ContextTypes.DEFAULT_TYPE):
-    settings = get_db().get_current_settings(update.chat_id)
-    get_db().update_show_transcription(update.chat_id, not settings.show_transcription)
-
-    # Get updated settings for the button display
-    settings_text = get_ai_settings_text(update.chat_id)
-    if settings_text is None:
-        return
+    settings = get_db().toggle_show_transcription(update.chat_id)
 
     await update.safe_edit_message_text(
-        text=settings_text, reply_markup=get_ai_settings_buttons(), parse_mode=ParseMode.MARKDOWN_V2
+        text=get_ai_settings_text(settings), reply_markup=AI_SETTINGS_BUTTONS, parse_mode=ParseMode.MARKDOWN_V2
     )
 
 
@@ -102,10 +105,13 @@ def get_language_selection_buttons() -> InlineKeyboardMarkup:
     return kbd.build()
 
 
+LANGUAGE_SELECTION_BUTTONS = get_language_selection_buttons()
+
+
 async def handle_set_ai_language(update: Update, _: ContextTypes.DEFAULT_TYPE):
     await update.safe_edit_message_text(
         text="🌍 *Choose AI Response Language*\n\nSelect the language for AI agent responses:",
-        reply_markup=get_language_selection_buttons(),
+        reply_markup=LANGUAGE_SELECTION_BUTTONS,
         parse_mode=ParseMode.MARKDOWN_V2,
     )
 
@@ -118,14 +124,12 @@ async def handle_set_language(update: Update, _: ContextTypes.DEFAULT_TYPE):
     if not callback_data.startswith("setLanguage_"):
         return
 
-    language_code = callback_data.replace("setLanguage_", "")
+    language_code = callback_data.removeprefix("setLanguage_")
     language = None if language_code == "none" else language_code
 
     # Update the language in the database
-    get_db().update_ai_response_language(update.chat_id, language)
+    settings = get_db().update_ai_response_language(update.chat_id, language)
 
-    # Get settings text and display updated AI settings
-    settings_text = get_ai_settings_text(update.chat_id)
     await update.safe_edit_message_text(
-        text=settings_text, reply_markup=get_ai_settings_buttons(), parse_mode=ParseMode.MARKDOWN_V2
+        text=get_ai_settings_text(settings), reply_markup=AI_SETTINGS_BUTTONS, parse_mode=ParseMode.MARKDOWN_V2
     )
@@ -1,3 +1,5 @@
+import asyncio
+
 from telegram import InlineKeyboardMarkup
 from telegram.constants import ParseMode
 from telegram.ext import ContextTypes
@@ -16,23 +18,27 @@ def get_general_settings_buttons() -> InlineKeyboardMarkup:
     return kbd.build(columns=1)
 
 
+SETTINGS_MENU_TEXT = "🛠️ 🆂🅴🆃🆃🅸🅽🅶🆂\n\nPlease choose a settings category:"
+
+# Keyboards are immutable, so the same markup is reused for every message
+GENERAL_SETTINGS_BUTTONS = get_general_settings_buttons()
+
+
 async def handle_settings(update: Update, context: ContextTypes.DEFAULT_TYPE):
     ensure_token(update)
 
     if update.message:
-        await update.message.reply_text(
-            text="🛠️ 🆂🅴🆃🆃🅸🅽🅶🆂\n\nPlease choose a settings category:",
-            reply_markup=get_general_settings_buttons(),
-            parse_mode=ParseMode.MARKDOWN_V2,
+        await asyncio.gather(
+            update.message.reply_text(
+                text=SETTINGS_MENU_TEXT, reply_markup=GENERAL_SETTINGS_BUTTONS, parse_mode=ParseMode.MARKDOWN_V2
+            ),
+            context.bot.delete_message(chat_id=update.chat_id, message_id=update.message.message_id),
         )
-        await context.bot.delete_message(chat_id=update.chat_id, message_id=update.message.message_id)
 
 
 async def handle_settings_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.safe_edit_message_text(
-        text="🛠️ 🆂🅴🆃🆃🅸🅽🅶🆂\n\nPlease choose a settings category:",
-        reply_markup=get_general_settings_buttons(),
-        parse_mode=ParseMode.MARKDOWN_V2,
+        text=SETTINGS_MENU_TEXT, reply_markup=GENERAL_SETTINGS_BUTTONS, parse_mode=ParseMode.MARKDOWN_V2
     )
 
 
@@ -1,7 +1,7 @@
 from datetime import timedelta
+from functools import lru_cache
 from textwrap import dedent
 
-import pytz
 from telegram import InlineKeyboardMarkup, LinkPreviewOptions
 from telegram.constants import ParseMode
 from telegram.ext import ContextTypes
@@ -9,175 +9,232 @@ from telegram.ext import ContextTypes
 from handlers.expectations import EXPECTING_TIME_ZONE, set_expectation
 from persistence import Settings, get_db
 from telegram_extensions import Update
-from utils import Keyboard
+from utils import Keyboard, get_timezone, is_stale_toggle, on_off
 
 # Time constants in seconds
 SECONDS_PER_MINUTE = 60
 SECONDS_PER_HOUR = 3600
 SECONDS_PER_DAY = 86400
 
+# (unit length, singular, plural), from the largest unit to the smallest
+POLL_INTERVAL_UNITS = (
+    (SECONDS_PER_DAY, "day", "days"),
+    (SECONDS_PER_HOUR, "hour", "hours"),
+    (SECONDS_PER_MINUTE, "minute", "minutes"),
+)
 
-def get_schedule_rendering_text(chat_id: int) -> str | None:
-    settings = get_db().get_current_settings(chat_id)
-    if settings is None:
-        return None
+SCHEDULE_RENDERING_TEXT_TEMPLATE = dedent(
+    """
+    🛠️ 🆂🅴🆃🆃🅸🅽🅶🆂 \\- *Schedule & Rendering*
 
+    ➊ *Poll interval*: {poll_interval}
+    > This is how often we check for new transactions\\.
+    {next_poll_at}
+    > Trigger now: /review\\_transactions
+
+    ➋ *Polling mode*: {polling_mode}
+    > When `posted` is enabled, the bot will poll for transactions that are already posted\\.
+    > This is the default mode and, because of the way Lunch Money/Plaid work, will allow categorizing
+    > the transactions and mark them as reviewed from Telegram\\.
+    >
+    > When `pending` the bot will poll for pending transactions, which sends you more timely notifications\\.
+
+
+    ➌ *Show full date/time*: {show_datetime}
+    > When enabled, shows the full date and time for each transaction\\.
+    > When disabled, shows only the date without the time\\.
+    > _We allow disabling time because more often than it is not reliable\\._
+
+
+    ➍ *Tagging*: {tagging}
+    > When enabled, renders categories as Telegram tags\\.
+    > Useful for filtering transactions\\.
+
+
+    ➎ *Timezone*: `{timezone}`
+    > This is the timezone used for displaying dates and times\\.
+
+    ➏ *Compact view*: {compact_view}
+    > When enabled, shows a compact view of transactions with less information\\.
+    """
+)
+
+TIMEZONE_PROMPT_TEXT = dedent(
+    """
+    Please provide a time zone\\.
+
+    The timezone must be specified in tz database format\\.
+
+    Examples:
+    \\- `UTC`
+    \\- `US/Eastern`
+    \\- `Europe/London`
+    \\- `Asia/Tokyo`
+
+    For a full list of time zones,
+    see [this link](https://en.wikipedia.org/wiki/List_of_tz_database_time_zones)\\.
+    """
+)
+
+
+# Users pick from a handful of preset intervals, so each one is only formatted once
+@lru_cache(maxsize=32)
+def format_poll_interval(poll_interval_secs: int) -> str:
+    """Formats an interval in the largest unit it spans, e.g. 7200 -> "2 hours"."""
+    # intervals shorter than a minute fall back to the smallest unit
+    unit_secs, singular, plural = next(
+        (unit for unit in POLL_INTERVAL_UNITS if poll_interval_secs >= unit[0]), POLL_INTERVAL_UNITS[-1]
+    )
+    count = poll_interval_secs // unit_secs
+    return f"{count} {singular if count == 1 else plural}"
+
+
+def get_schedule_rendering_text(settings: Settings) -> str:
     poll_interval = settings.poll_interval_secs
     next_poll_at = ""
     if poll_interval is None or poll_interval == 0:
         poll_interval = "Disabled"
     else:
-        if poll_interval < SECONDS_PER_HOUR:
-            poll_interval = f"`{poll_interval // SECONDS_PER_MINUTE} minutes`"
-        elif poll_interval < SECONDS_PER_DAY:
-            if poll_interval // SECONDS_PER_HOUR == 1:
-                poll_interval = "`1 hour`"
-            else:
-                poll_interval = f"`{poll_interval // SECONDS_PER_HOUR} hours`"
-        elif poll_interval // SECONDS_PER_DAY == 1:
-            poll_interval = "`1 day`"
-        else:
-            poll_interval = f"`{poll_interval // SECONDS_PER_DAY} days`"
+        poll_interval = f"`{format_poll_interval(poll_interval)}`"
 
         last_poll = settings.last_poll_at
         if last_poll:
             next_poll_at = last_poll + timedelta(seconds=settings.poll_interval_secs)
-            next_poll_at = next_poll_at.astimezone(pytz.timezone(settings.timezone or "UTC"))
+            next_poll_at = next_poll_at.astimezone(get_timezone(settings.timezone))
             next_poll_at = f"> Next poll at `{next_poll_at.strftime('%a, %b %d at %I:%M %p %Z')}`"
 
-    return dedent(
-        f"""
-        🛠️ 🆂🅴🆃🆃🅸🅽🅶🆂 \\- *Schedule & Rendering*
-
-        ➊ *Poll interval*: {poll_interval}
-        > This is how often we check for new transactions\\.
-        {next_poll_at}
-        > Trigger now: /review\\_transactions
-
-        ➋ *Polling mode*: {"`pending`" if settings.poll_pending else "`posted`"}
-        > When `posted` is enabled, the bot will poll for transactions that are already posted\\.
-        > This is the default mode and, because of the way Lunch Money/Plaid work, will allow categorizing
-        > the transactions and mark them as reviewed from Telegram\\.
-        >
-        > When `pending` the bot will poll for pending transactions, which sends you more timely notifications\\.
-
-
-        ➌ *Show full date/time*: {"🟢 ᴏɴ" if settings.show_datetime else "🔴 ᴏꜰꜰ"}
-        > When enabled, shows the full date and time for each transaction\\.
-        > When disabled, shows only the date without the time\\.
-        > _We allow disabling time because more often than it is not reliable\\._
-
-
-        ➍ *Tagging*: {"🟢 ᴏɴ" if settings.tagging else "🔴 ᴏꜰꜰ"}
-        > When enabled, renders categories as Telegram tags\\.
-        > Useful for filtering transactions\\.
-
+    return SCHEDULE_RENDERING_TEXT_TEMPLATE.format_map(
+        {
+            "poll_interval": poll_interval,
+            "next_poll_at": next_poll_at,
+            "polling_mode": "`pending`" if settings.poll_pending else "`posted`",
+            "show_datetime": on_off(settings.show_datetime),
+            "tagging": on_off(settings.tagging),
+            "timezone": settings.timezone,
+            "compact_view": on_off(settings.compact_view),
+        }
+    )
 
-        ➎ *Timezone*: `{settings.timezone}`
-        > This is the timezone used for displaying dates and times\\.
 
-        ➏ *Compact view*: {"🟢 ᴏɴ" if settings.compact_view else "🔴 ᴏꜰꜰ"}
-        > When enabled, shows a compact view of transactions with less information\\.
-        """
+def get_schedule_rendering_buttons(settings: Settings) -> InlineKeyboardMarkup:
+    return build_schedule_rendering_buttons(
+        settings.poll_pending, settings.show_datetime, settings.tagging, settings.compact_view
     )
 
 
-def get_schedule_rendering_buttons(settings: Settings) -> InlineKeyboardMarkup:
+# The keyboard only depends on four flags, so each of its 16 variants is built once and shared
+@lru_cache(maxsize=16)
+def build_schedule_rendering_buttons(
+    poll_pending: bool, show_datetime: bool, tagging: bool, compact_view: bool
+) -> InlineKeyboardMarkup:
     kbd = Keyboard()
     kbd += ("➊ Change interval", "changePollInterval")
-    kbd += ("➋ Toggle polling mode", f"togglePollPending_{settings.poll_pending}")
-    kbd += ("➌ Show date/time?", f"toggleShowDateTime_{settings.show_datetime}")
-    kbd += ("➍ Toggle tagging", f"toggleTagging_{settings.tagging}")
+    kbd += ("➋ Toggle polling mode", f"togglePollPending_{poll_pending}")
+    kbd += ("➌ Show date/time?", f"toggleShowDateTime_{show_datetime}")
+    kbd += ("➍ Toggle tagging", f"toggleTagging_{tagging}")
     kbd += ("➎ Change timezone", "changeTimezone")
-    kbd += ("➏ Toggle compact view", f"toggleCompactView_{settings.compact_view}")
+    kbd += ("➏ Toggle compact view", f"toggleCompactView_{compact_view}")
     kbd += ("Back", "settingsMenu")
     return kbd.build()
 
 
+def get_poll_interval_buttons() -> InlineKeyboardMarkup:
+    kbd = Keyboard()
+    kbd += ("5 minutes", "changePollInterval_300")
+    kbd += ("30 minutes", "changePollInterval_1800")
+    kbd += ("1 hour", "changePollInterval_3600")
+    kbd += ("4 hours", "changePollInterval_14400")
+    kbd += ("24 hours", "changePollInterval_86400")
+    kbd += ("Disable", "changePollInterval_0")
+    kbd += ("Cancel", "cancelPollIntervalChange")
+    return kbd.build()
+
+
+POLL_INTERVAL_BUTTONS = get_poll_interval_buttons()
+
+
 async def handle_schedule_rendering_settings(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    settings_text = get_schedule_rendering_text(update.chat_id)
-    if settings_text:
-        settings = get_db().get_current_settings(update.chat_id)
-        await update.safe_edit_message_text(
-            text=settings_text, reply_markup=get_schedule_rendering_buttons(settings), parse_mode=ParseMode.MARKDOWN_V2
-        )
+    settings = get_db().get_current_settings(update.chat_id)
+    await update.safe_edit_message_text(
+        text=get_schedule_rendering_text(settings),
+        reply_markup=get_schedule_rendering_buttons(settings),
+        parse_mode=ParseMode.MARKDOWN_V2,
+    )
 
 
 async def handle_btn_change_poll_interval(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Changes the poll interval for the chat."""
     if update.callback_query and update.callback_query.data and "_" in update.callback_query.data:
         poll_interval = int(update.callback_data_suffix)
-        get_db().update_poll_interval(update.chat_id, poll_interval)
-        settings = get_db().get_current_settings(update.chat_id)
+        settings = get_db().update_poll_interval(update.chat_id, poll_interval)
         await update.safe_edit_message_text(
-            text=f"_Poll interval updated_\n\n{get_schedule_rendering_text(update.chat_id)}",
+            text=f"_Poll interval updated_\n\n{get_schedule_rendering_text(settings)}",
             reply_markup=get_schedule_rendering_buttons(settings),
             parse_mode=ParseMode.MARKDOWN_V2,
         )
     else:
-        kbd = Keyboard()
-        kbd += ("5 minutes", "changePollInterval_300")
-        kbd += ("30 minutes", "changePollInterval_1800")
-        kbd += ("1 hour", "changePollInterval_3600")
-        kbd += ("4 hours", "changePollInterval_14400")
-        kbd += ("24 hours", "changePollInterval_86400")
-        kbd += ("Disable", "changePollInterval_0")
-        kbd += ("Cancel", "cancelPollIntervalChange")
         await update.safe_edit_message_text(
-            text="Please choose the new poll interval in minutes...", reply_markup=kbd.build()
+            text="Please choose the new poll interval in minutes...", reply_markup=POLL_INTERVAL_BUTTONS
         )
 
 
 async def handle_btn_cancel_poll_interval_change(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    settings_text = get_schedule_rendering_text(update.chat_id)
     settings = get_db().get_current_settings(update.chat_id)
     await update.safe_edit_message_text(
-        text=settings_text, reply_markup=get_schedule_rendering_buttons(settings), parse_mode=ParseMode.MARKDOWN_V2
+        text=get_schedule_rendering_text(settings),
+        reply_markup=get_schedule_rendering_buttons(settings),
+        parse_mode=ParseMode.MARKDOWN_V2,
     )
 
 
 async def handle_btn_toggle_poll_pending(update: Update, _: ContextTypes.DEFAULT_TYPE):
-    settings = get_db().get_current_settings(update.chat_id)
-    get_db().update_poll_pending(update.chat_id, not settings.poll_pending)
+    db = get_db()
+    settings = db.get_current_settings(update.chat_id)
+    # a tap on an outdated keyboard only redraws the menu with the current state
+    if not is_stale_toggle(update, settings.poll_pending):
+        settings = db.toggle_poll_pending(update.chat_id)
 
     await update.safe_edit_message_text(
-        text=get_schedule_rendering_text(update.chat_id),
+        text=get_schedule_rendering_text(settings),
         reply_markup=get_schedule_rendering_buttons(settings),
         parse_mode=ParseMode.MARKDOWN_V2,
     )
 
 
 async def handle_btn_toggle_show_datetime(update: Update, _: ContextTypes.DEFAULT_TYPE):
-    settings = get_db().get_current_settings(update.chat_id)
-
-    get_db().update_show_datetime(update.chat_id, not settings.show_datetime)
+    db = get_db()
+    settings = db.get_current_settings(update.chat_id)
+    if not is_stale_toggle(update, settings.show_datetime):
+        settings = db.toggle_show_datetime(update.chat_id)
 
     await update.safe_edit_message_text(
-        text=get_schedule_rendering_text(update.chat_id),
+        text=get_schedule_rendering_text(settings),
         reply_markup=get_schedule_rendering_buttons(settings),
         parse_mode=ParseMode.MARKDOWN_V2,
     )
 
 
 async def handle_btn_toggle_tagging(update: Update, _: ContextTypes.DEFAULT_TYPE):
-    settings = get_db().get_current_settings(update.chat_id)
-
-    get_db().update_tagging(update.chat_id, not settings.tagging)
+    db = get_db()
+    settings = db.get_current_settings(update.chat_id)
+    if not is_stale_toggle(update, settings.tagging):
+        settings = db.toggle_tagging(update.chat_id)
 
     await update.safe_edit_message_text(
-        text=get_schedule_rendering_text(update.chat_id),
+        text=get_schedule_rendering_text(settings),
         reply_markup=get_schedule_rendering_buttons(settings),
         parse_mode=ParseMode.MARKDOWN_V2,
     )
 
 
 async def handle_btn_toggle_compact_view(update: Update, _: ContextTypes.DEFAULT_TYPE):
-    settings = get_db().get_current_settings(update.chat_id)
-
-    get_db().update_compact_view(update.chat_id, not settings.compact_view)
+    db = get_db()
+    settings = db.get_current_settings(update.chat_id)
+    if not is_stale_toggle(update, settings.compact_view):
+        settings = db.toggle_compact_view(update.chat_id)
 
     await update.safe_edit_message_text(
-        text=get_schedule_rendering_text(update.chat_id),
+        text=get_schedule_rendering_text(settings),
         reply_markup=get_schedule_rendering_buttons(settings),
         parse_mode=ParseMode.MARKDOWN_V2,
     )
@@ -186,22 +243,7 @@ async def handle_btn_toggle_compact_view(update: Update, _: ContextTypes.DEFAULT
 async def handle_btn_change_timezone(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Changes the timezone for the chat."""
     msg = await update.safe_edit_message_text(
-        text=dedent(
-            """
-            Please provide a time zone\\.
-
-            The timezone must be specified in tz database format\\.
-
-            Examples:
-            \\- `UTC`
-            \\- `US/Eastern`
-            \\- `Europe/London`
-            \\- `Asia/Tokyo`
-
-            For a full list of time zones,
-            see [this link](https://en.wikipedia.org/wiki/List_of_tz_database_time_zones)\\.
-            """
-        ),
+        text=TIMEZONE_PROMPT_TEXT,
         parse_mode=ParseMode.MARKDOWN_V2,
         link_preview_options=LinkPreviewOptions(is_disabled=True),
     )
@@ -1,3 +1,4 @@
+import asyncio
 import re
 from textwrap import dedent
 
@@ -6,24 +7,23 @@ from telegram.constants import ParseMode
 from telegram.ext import ContextTypes
 
 from handlers.expectations import EXPECTING_TOKEN, clear_expectation, set_expectation
+from handlers.settings.account_filtering import invalidate_plaid_accounts
 from lunch import get_lunch_client, get_lunch_client_for_chat_id
-from persistence import get_db
+from persistence import Settings, get_db
 from telegram_extensions import Update
 from utils import Keyboard
 
+SESSION_TEXT_TEMPLATE = dedent(
+    """
+    🛠️ 🆂🅴🆃🆃🅸🅽🅶🆂 \\- *Session*
 
-def get_session_text(chat_id: int) -> str | None:
-    settings = get_db().get_current_settings(chat_id)
-    if settings is None:
-        return None
+    *API token*: ||{token}||
+    """
+)
 
-    return dedent(
-        f"""
-        🛠️ 🆂🅴🆃🆃🅸🅽🅶🆂 \\- *Session*
 
-        *API token*: ||{settings.token}||
-        """
-    )
+def get_session_text(settings: Settings) -> str:
+    return SESSION_TEXT_TEMPLATE.format_map({"token": settings.token})
 
 
 def get_session_buttons() -> InlineKeyboardMarkup:
@@ -34,9 +34,14 @@ def get_session_buttons() -> InlineKeyboardMarkup:
     return kbd.build()
 
 
+SESSION_BUTTONS = get_session_buttons()
+
+
 async def handle_session_settings(update: Update, _: ContextTypes.DEFAULT_TYPE):
     await update.safe_edit_message_text(
-        text=get_session_text(update.chat_id), reply_markup=get_session_buttons(), parse_mode=ParseMode.MARKDOWN_V2
+        text=get_session_text(get_db().get_current_settings(update.chat_id)),
+        reply_markup=SESSION_BUTTONS,
+        parse_mode=ParseMode.MARKDOWN_V2,
     )
 
 
@@ -46,28 +51,35 @@ async def handle_btn_set_token_from_button(update: Update, _: ContextTypes.DEFAU
         set_expectation(update.chat_id, {"expectation": EXPECTING_TOKEN, "msg_id": msg.message_id})
 
 
-async def handle_logout(update: Update, _: ContextTypes.DEFAULT_TYPE):
+def get_logout_confirm_buttons() -> InlineKeyboardMarkup:
     kbd = Keyboard()
     kbd += ("Yes, delete my token", "logout_confirm")
     kbd += ("Nevermind", "logout_cancel")
-    await update.safe_edit_message_text(
-        text=dedent(
-            """
-            This will remove the API token from the DB and delete all the cache associated with this chat.
-            You need to delete the chat history manually by deleting the whole chat.
+    return kbd.build()
 
-            You can /start again anytime you want by providing a new token.
 
-            Are you sure you want to continue?
-            """
-        ),
-        reply_markup=kbd.build(),
-    )
+LOGOUT_CONFIRM_BUTTONS = get_logout_confirm_buttons()
+
+LOGOUT_CONFIRM_TEXT = dedent(
+    """
+    This will remove the API token from the DB and delete all the cache associated with this chat.
+    You need to delete the chat history manually by deleting the whole chat.
+
+    You can /start again anytime you want by providing a new token.
+
+    Are you sure you want to continue?
+    """
+)
+
+
+async def handle_logout(update: Update, _: ContextTypes.DEFAULT_TYPE):
+    await update.safe_edit_message_text(text=LOGOUT_CONFIRM_TEXT, reply_markup=LOGOUT_CONFIRM_BUTTONS)
 
 
 async def handle_logout_confirm(update: Update, _: ContextTypes.DEFAULT_TYPE):
+    # logout removes the transaction history too, in the same database transaction
     get_db().logout(update.chat_id)
-    get_db().delete_transactions_for_chat(update.chat_id)
+    invalidate_plaid_accounts(update.chat_id)
 
     await update.safe_delete_message(
         answer_text="Your API token has been removed, as well as the transaction history. It was a pleasure to serve you 🖖"
@@ -80,22 +92,25 @@ async def handle_logout_cancel(update: Update, _: ContextTypes.DEFAULT_TYPE):
 
 async def handle_btn_trigger_plaid_refresh(update: Update, context: ContextTypes.DEFAULT_TYPE):
     lunch = get_lunch_client_for_chat_id(update.chat_id)
-    lunch.trigger_fetch_from_plaid()
+    await asyncio.to_thread(lunch.trigger_fetch_from_plaid)
+    # the refresh may bring in newly linked accounts
+    invalidate_plaid_accounts(update.chat_id)
 
-    settings_text = get_session_text(update.chat_id)
+    settings_text = get_session_text(get_db().get_current_settings(update.chat_id))
     await update.safe_edit_message_text(
         text=f"_Plaid refresh triggered_\n\n{settings_text}",
-        reply_markup=get_session_buttons(),
+        reply_markup=SESSION_BUTTONS,
         parse_mode=ParseMode.MARKDOWN_V2,
     )
 
 
-def extract_api_token(input_string: str) -> str:
-    # Define the regex pattern for the API token
-    pattern = r"\b[a-f0-9]{50}\b"
+# Lunch Money API tokens are 50 hexadecimal characters
+API_TOKEN_PATTERN = re.compile(r"\b[a-f0-9]{50}\b")
 
+
+def extract_api_token(input_string: str) -> str:
     # Search for the pattern in the input string
-    match = re.search(pattern, input_string)
+    match = API_TOKEN_PATTERN.search(input_string)
 
     # If a match is found, return the matched string, otherwise return None
     return match.group(0) if match else None
@@ -124,39 +139,41 @@ async def handle_register_token(update: Update, context: ContextTypes.DEFAULT_TY
     try:
         # make sure the token is valid
         lunch = get_lunch_client(token)
-        lunch_user = lunch.get_user()
+        lunch_user = await asyncio.to_thread(lunch.get_user)
         get_db().save_token(update.chat_id, token)
 
         clear_expectation(hello_msg_id)
 
-        await context.bot.delete_message(chat_id=update.chat_id, message_id=hello_msg_id)
-
-        await context.bot.send_message(
-            chat_id=update.chat_id,
-            text=dedent(
-                f"""
-                🎉 🎊 Hello {lunch_user.user_name}!
+        # the welcome message doesn't need to wait for the hello message to be gone
+        await asyncio.gather(
+            context.bot.delete_message(chat_id=update.chat_id, message_id=hello_msg_id),
+            context.bot.send_message(
+                chat_id=update.chat_id,
+                text=dedent(
+                    f"""
+                    🎉 🎊 Hello {lunch_user.user_name}!
 
-                Your token was successfully stored. I will start polling for unreviewed transactions, shortly.
+                    Your token was successfully stored. I will start polling for unreviewed transactions, shortly.
 
-                These are some commands to get you started:
+                    These are some commands to get you started:
 
-                /review\\_transactions - Check for unreviewed transactions now.
+                    /review\\_transactions - Check for unreviewed transactions now.
 
-                Use /settings to change my behavior, like how often to poll for new transactions.
+                    Use /settings to change my behavior, like how often to poll for new transactions.
 
-                /add\\_transaction - Adds a transaction manually
-                /show\\_budget - Show the budget for the current month
-                /balances - Shows the current balances in all accounts
+                    /add\\_transaction - Adds a transaction manually
+                    /show\\_budget - Show the budget for the current month
+                    /balances - Shows the current balances in all accounts
 
-                Need help?
-                [Join our Discord support channel](https://discord.com/channels/842337014556262411/1311765488140816484)
+                    Need help?
+                    [Join our Discord support channel](https://discord.com/channels/842337014556262411/1311765488140816484)
 
-                (_I deleted the message with the token you provided for security purposes_)
-                """
+                    (_I deleted the message with the token you provided for security purposes_)
+                    """
+                ),
+                parse_mode=ParseMode.MARKDOWN,
+                disable_web_page_preview=True,
             ),
-            parse_mode=ParseMode.MARKDOWN,
-            disable_web_page_preview=True,
         )
     except Exception as e:
         # if e contains "Access token does not exist." it means
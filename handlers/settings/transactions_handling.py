@@ -1,3 +1,4 @@
+from functools import lru_cache
 from textwrap import dedent
 
 from telegram import InlineKeyboardMarkup
@@ -6,48 +7,61 @@ from telegram.ext import ContextTypes
 
 from persistence import Settings, get_db
 from telegram_extensions import Update
-from utils import Keyboard
+from utils import Keyboard, is_stale_toggle, on_off
 
+TRANSACTIONS_HANDLING_TEXT_TEMPLATE = dedent(
+    """
+    🛠️ 🆂🅴🆃🆃🅸🅽🅶🆂 \\- *Transactions Handling*
 
-def get_transactions_handling_text(chat_id: int) -> str | None:
-    settings = get_db().get_current_settings(chat_id)
-    if settings is None:
-        return None
+    ➊ *Auto\\-mark transactions as reviewed*: {auto_mark_reviewed}
+    > When enabled, transactions will be marked as reviewed automatically after being sent to Telegram\\.
+    > When disabled, you need to explicitly mark them as reviewed\\.
 
-    return dedent(
-        f"""
-        🛠️ 🆂🅴🆃🆃🅸🅽🅶🆂 \\- *Transactions Handling*
 
-        ➊ *Auto\\-mark transactions as reviewed*: {"🟢 ᴏɴ" if settings.auto_mark_reviewed else "🔴 ᴏꜰꜰ"}
-        > When enabled, transactions will be marked as reviewed automatically after being sent to Telegram\\.
-        > When disabled, you need to explicitly mark them as reviewed\\.
+    ➋ *Mark as reviewed after categorization*: {mark_reviewed_after_categorized}
+    > When enabled, transactions will be marked as reviewed automatically after being categorized\\.
 
 
-        ➋ *Mark as reviewed after categorization*: {"🟢 ᴏɴ" if settings.mark_reviewed_after_categorized else "🔴 ᴏꜰꜰ"}
-        > When enabled, transactions will be marked as reviewed automatically after being categorized\\.
+    ➌ *Auto\\-categorize after adding notes*: {auto_categorize_after_notes}
+    > When enabled, automatically runs auto\\-categorization after a note is added to a transaction\\.
+    > _Requires AI to be enabled_\\.
 
 
-        ➌ *Auto\\-categorize after adding notes*: {"🟢 ᴏɴ" if settings.auto_categorize_after_notes else "🔴 ᴏꜰꜰ"}
-        > When enabled, automatically runs auto\\-categorization after a note is added to a transaction\\.
-        > _Requires AI to be enabled_\\.
+    ➍ *Account Filtering*
+    > Configure which accounts should be ignored for transaction notifications\\.
 
 
-        ➍ *Account Filtering*
-        > Configure which accounts should be ignored for transaction notifications\\.
+    ➎ *Sync delete with Lunch Money*: {sync_delete_with_lunchmoney}
+    > When enabled, dismissing a transaction message will also delete it from Lunch Money\\.
+    > _Disabled by default\\. Only works for manually\\-created transactions\\._
+    """
+)
 
 
-        ➎ *Sync delete with Lunch Money*: {"🟢 ᴏɴ" if settings.sync_delete_with_lunchmoney else "🔴 ᴏꜰꜰ"}
-        > When enabled, dismissing a transaction message will also delete it from Lunch Money\\.
-        > _Disabled by default\\. Only works for manually\\-created transactions\\._
-        """
+def get_transactions_handling_text(settings: Settings) -> str:
+    return TRANSACTIONS_HANDLING_TEXT_TEMPLATE.format_map(
+        {
+            "auto_mark_reviewed": on_off(settings.auto_mark_reviewed),
+            "mark_reviewed_after_categorized": on_off(settings.mark_reviewed_after_categorized),
+            "auto_categorize_after_notes": on_off(settings.auto_categorize_after_notes),
+            "sync_delete_with_lunchmoney": on_off(settings.sync_delete_with_lunchmoney),
+        }
     )
 
 
 def get_transactions_handling_buttons(settings: Settings) -> InlineKeyboardMarkup:
+    return build_transactions_handling_buttons(settings.auto_mark_reviewed, settings.auto_categorize_after_notes)
+
+
+# The keyboard only depends on two flags, so each of its variants is built once and shared
+@lru_cache(maxsize=4)
+def build_transactions_handling_buttons(
+    auto_mark_reviewed: bool, auto_categorize_after_notes: bool
+) -> InlineKeyboardMarkup:
     kbd = Keyboard()
-    kbd += ("➊ Auto-mark reviewed?", f"toggleAutoMarkReviewed_{settings.auto_mark_reviewed}")
+    kbd += ("➊ Auto-mark reviewed?", f"toggleAutoMarkReviewed_{auto_mark_reviewed}")
     kbd += ("➋ Mark reviewed after categorization?", "toggleMarkReviewedAfterCategorized")
-    kbd += ("➌ Auto-categorize after notes?", f"toggleAutoCategorizeAfterNotes_{settings.auto_categorize_after_notes}")
+    kbd += ("➌ Auto-categorize after notes?", f"toggleAutoCategorizeAfterNotes_{auto_categorize_after_notes}")
     kbd += ("➍ Account Filtering", "accountFilteringSettings")
     kbd += ("➎ Sync delete with Lunch Money?", "toggleSyncDeleteWithLunchMoney")
     kbd += ("Back", "settingsMenu")
@@ -55,55 +69,55 @@ def get_transactions_handling_buttons(settings: Settings) -> InlineKeyboardMarku
 
 
 async def handle_transactions_handling_settings(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    settings_text = get_transactions_handling_text(update.chat_id)
-    if settings_text:
-        settings = get_db().get_current_settings(update.chat_id)
-        await update.safe_edit_message_text(
-            text=settings_text,
-            reply_markup=get_transactions_handling_buttons(settings),
-            parse_mode=ParseMode.MARKDOWN_V2,
-        )
+    settings = get_db().get_current_settings(update.chat_id)
+    await update.safe_edit_message_text(
+        text=get_transactions_handling_text(settings),
+        reply_markup=get_transactions_handling_buttons(settings),
+        parse_mode=ParseMode.MARKDOWN_V2,
+    )
 
 
 async def handle_btn_toggle_auto_mark_reviewed(update: Update, _: ContextTypes.DEFAULT_TYPE):
-    settings = get_db().get_current_settings(update.chat_id)
-    get_db().update_auto_mark_reviewed(update.chat_id, not settings.auto_mark_reviewed)
+    db = get_db()
+    settings = db.get_current_settings(update.chat_id)
+    if not is_stale_toggle(update, settings.auto_mark_reviewed):
+        settings = db.toggle_auto_mark_reviewed(update.chat_id)
 
     await update.safe_edit_message_text(
-        text=get_transactions_handling_text(update.chat_id),
+        text=get_transactions_handling_text(settings),
         reply_markup=get_transactions_handling_buttons(settings),
         parse_mode=ParseMode.MARKDOWN_V2,
     )
 
 
 async def handle_btn_toggle_mark_reviewed_after_categorized(update: Update, _: ContextTypes.DEFAULT_TYPE):
-    settings = get_db().get_current_settings(update.chat_id)
-    get_db().update_mark_reviewed_after_categorized(update.chat_id, not settings.mark_reviewed_after_categorized)
+    settings = get_db().toggle_mark_reviewed_after_categorized(update.chat_id)
 
     await update.safe_edit_message_text(
-        text=get_transactions_handling_text(update.chat_id),
+        text=get_transactions_handling_text(settings),
         reply_markup=get_transactions_handling_buttons(settings),
         parse_mode=ParseMode.MARKDOWN_V2,
     )
 
 
 async def handle_btn_toggle_auto_categorize_after_notes(update: Update, _: ContextTypes.DEFAULT_TYPE):
-    settings = get_db().get_current_settings(update.chat_id)
-    get_db().update_auto_categorize_after_notes(update.chat_id, not settings.auto_categorize_after_notes)
+    db = get_db()
+    settings = db.get_current_settings(update.chat_id)
+    if not is_stale_toggle(update, settings.auto_categorize_after_notes):
+        settings = db.toggle_auto_categorize_after_notes(update.chat_id)
 
     await update.safe_edit_message_text(
-        text=get_transactions_handling_text(update.chat_id),
+        text=get_transactions_handling_text(settings),
         reply_markup=get_transactions_handling_buttons(settings),
         parse_mode=ParseMode.MARKDOWN_V2,
     )
 
 
 async def handle_btn_toggle_sync_delete_with_lunchmoney(update: Update, _: ContextTypes.DEFAULT_TYPE):
-    settings = get_db().get_current_settings(update.chat_id)
-    get_db().update_sync_delete_with_lunchmoney(update.chat_id, not settings.sync_delete_with_lunchmoney)
+    settings = get_db().toggle_sync_delete_with_lunchmoney(update.chat_id)
 
     await update.safe_edit_message_text(
-        text=get_transactions_handling_text(update.chat_id),
-        reply_markup=get_transactions_handling_buttons(get_db().get_current_settings(update.chat_id)),
+        text=get_transactions_handling_text(settings),
+        reply_markup=get_transactions_handling_buttons(settings),
         parse_mode=ParseMode.MARKDOWN_V2,
     )
@@ -16,14 +16,16 @@ async def handle_resync(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.message or not update.message.text:
         return
 
-    parts = update.message.text.split(" ")
+    # only the first argument matters, so there is no need to split the whole message
+    _, _, args = update.message.text.partition(" ")
     last_n_days = 15  # default to last 15 days
-    if len(parts) > 1:
-        last_n_days = int(parts[1])
+    if args:
+        last_n_days = int(args.partition(" ")[0])
 
     chat_id = update.chat_id
     lunch = get_lunch_client_for_chat_id(chat_id)
-    chat_txs = get_db().get_all_tx_by_chat_id(chat_id)
+    db = get_db()
+    chat_txs = db.get_all_tx_by_chat_id(chat_id)
 
     # get the created_at bounds (i.e. the earliest and latest tx)
     earliest_tx_date = min(chat_txs, key=lambda tx: tx.created_at).created_at.replace(
@@ -61,9 +63,9 @@ async def handle_resync(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
                 # update the tx in the db
                 if lunch_tx.status == "cleared":
-                    get_db().mark_as_reviewed(tx.message_id, chat_id)
+                    db.mark_as_reviewed(tx.message_id, chat_id)
                 else:
-                    get_db().mark_as_unreviewed(tx.message_id, chat_id)
+                    db.mark_as_unreviewed(tx.message_id, chat_id)
             except Exception:
                 logger.exception(f"Error sending transaction message for tx_id {tx.tx_id}")
                 errors += 1
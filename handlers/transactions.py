@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from datetime import UTC, datetime, timedelta
 from textwrap import dedent
@@ -13,7 +14,7 @@ from constants import NOTES_MAX_LENGTH, TOKEN_BLOCKED, TOKEN_REVOKED
 from handlers.ai_agent import handle_generic_message_with_ai
 from handlers.categorization import ai_categorize_transaction, categorize_transaction_with_agent
 from handlers.expectations import EDIT_NOTES, RENAME_PAYEE, SET_TAGS, set_expectation
-from lunch import get_lunch_client_for_chat_id
+from lunch import get_lunch_client_for_chat_id, get_transaction_async
 from persistence import get_db
 from telegram_extensions import Update
 from tx_messaging import get_rendered_transaction_message, get_tx_buttons, send_plaid_details, send_transaction_message
@@ -21,6 +22,30 @@ from utils import Keyboard, ensure_token
 
 logger = logging.getLogger("tx_handler")
 
+LUNCH_MONEY_V2_TRANSACTIONS_URL = "https://api.lunchmoney.dev/v2/transactions"
+
+# How many transactions are updated and re-rendered at once while polling;
+# keeps a large batch from bumping into Lunch Money's and Telegram's rate limits
+POLL_UPDATES_CONCURRENCY = 5
+
+# Shared across requests so deletes reuse the keep-alive connection to Lunch Money
+# instead of paying for a new TCP + TLS handshake every time
+lunch_money_v2_client = httpx.AsyncClient()
+
+EDIT_NOTES_PROMPT_TEXT = dedent(
+    """
+    Please enter notes for this transaction.\n\n
+    *Hint:* _you can also reply to the transaction message to edit its notes._"""
+)
+
+SET_TAGS_PROMPT_TEXT = dedent(
+    """
+    Please enter the tags for this transaction\n\n
+    💡 *Hint:* _you can also reply to the transaction message to edit its tags
+    if the message contains only tags like this: #tag1 #tag2 #etc_
+    """
+)
+
 
 # Sort transactions by date in chronological order (oldest first)
 # Use plaid's authorized_datetime if available for more precise sorting
@@ -45,7 +70,10 @@ async def fetch_transactions(chat_id: int, days_lookback: int, pending: bool):
     lunch = get_lunch_client_for_chat_id(chat_id)
     start_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days_lookback)
     end_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    transactions = lunch.get_transactions(pending=pending, start_date=start_date, end_date=end_date)
+    # lunchable's call is blocking, run it in a thread so the event loop (and a concurrent fetch) can proceed
+    transactions = await asyncio.to_thread(
+        lunch.get_transactions, pending=pending, start_date=start_date, end_date=end_date
+    )
 
     # TODO: this seems to be a bug in the LunchMoney API
     # Filter out transactions whose pending state does not match the requested one
@@ -65,7 +93,7 @@ async def fetch_transactions(chat_id: int, days_lookback: int, pending: bool):
 def _apply_account_filtering(chat_id: int, transactions: list[TransactionObject]) -> list[TransactionObject]:
     """Apply account filtering to remove transactions from ignored accounts."""
     try:
-        ignored_accounts = get_db().get_ignored_accounts_list(chat_id)
+        ignored_accounts = get_db().get_ignored_accounts_set(chat_id)
         if ignored_accounts:
             logger.info(f"Filtering out transactions from {len(ignored_accounts)} ignored accounts for chat {chat_id}")
             original_count = len(transactions)
@@ -108,17 +136,20 @@ async def check_transactions_and_telegram_them(
         f"Polling for {'pending' if poll_pending else 'posted'} transactions from {days_lookback} days ago for chat {chat_id}..."
     )
 
-    # Always get posted transactions
-    posted_transactions = await fetch_transactions(chat_id, days_lookback, pending=False)
-
-    # Get pending transactions if requested
+    # Always get posted transactions, and pending transactions if requested. Both requests
+    # are independent, so they are made concurrently
     if poll_pending:
-        pending_transactions = await fetch_transactions(chat_id, days_lookback, pending=True)
+        posted_transactions, pending_transactions = await asyncio.gather(
+            fetch_transactions(chat_id, days_lookback, pending=False),
+            fetch_transactions(chat_id, days_lookback, pending=True),
+        )
         transactions_to_process = pending_transactions + posted_transactions
     else:
+        posted_transactions = await fetch_transactions(chat_id, days_lookback, pending=False)
         transactions_to_process = posted_transactions
 
-    settings = get_db().get_current_settings(chat_id)
+    db = get_db()
+    settings = db.get_current_settings(chat_id)
     all_updated_message_ids = set()
 
     ## 2. Apply account filtering to remove transactions from ignored accounts
@@ -151,20 +182,30 @@ async def check_transactions_and_telegram_them(
                 transaction.status = "cleared"
 
     # 4. Send new transactions to Telegram that haven't been sent before
-    for transaction in transactions_to_process:
-        if get_db().was_already_sent(transaction.id):
-            logger.debug(f"Skipping already sent transaction {transaction.id} in chat {chat_id}")
-            continue
-
-        msg_id = await send_transaction_message(context, transaction, chat_id)
-        get_db().mark_as_sent(
-            transaction.id,
-            chat_id,
-            msg_id,
-            transaction.recurring_type,
-            reviewed=transaction.status == "cleared",
-            plaid_id=(transaction.plaid_metadata.get("transaction_id", None) if transaction.plaid_metadata else None),
-        )
+    sent_rows = []
+    # look up which transactions were sent by previous polls at once, instead of one query per transaction
+    sent_tx_ids = db.get_already_sent_tx_ids(transaction.id for transaction in transactions_to_process)
+    try:
+        for transaction in transactions_to_process:
+            if transaction.id in sent_tx_ids:
+                logger.debug(f"Skipping already sent transaction {transaction.id} in chat {chat_id}")
+                continue
+
+            msg_id = await send_transaction_message(context, transaction, chat_id)
+            sent_tx_ids.add(transaction.id)
+            sent_rows.append(
+                (
+                    transaction.id,
+                    chat_id,
+                    msg_id,
+                    transaction.recurring_type,
+                    transaction.status == "cleared",
+                    transaction.plaid_metadata.get("transaction_id", None) if transaction.plaid_metadata else None,
+                )
+            )
+    finally:
+        # record whatever was sent, even if a later message failed, so the next poll doesn't resend it
+        db.mark_as_sent_many(sent_rows)
 
     # 5. Update Telegram messages for transactions that had their IDs updated or were marked as reviewed
     if poll_pending:
@@ -180,26 +221,32 @@ async def resync_updted_transactions(
 
     logger.info(f"Resyncing {len(updated_message_ids)} updated transactions for chat {chat_id}")
     lunch = get_lunch_client_for_chat_id(chat_id)
-    for message_id in updated_message_ids:
+    semaphore = asyncio.Semaphore(POLL_UPDATES_CONCURRENCY)
+    # Load the transaction IDs associated with all the messages at once
+    tx_ids_by_message_id = get_db().get_tx_ids_for_message_ids(chat_id, updated_message_ids)
+
+    async def resync_message(message_id: int) -> None:
         try:
-            # Get the transaction ID associated with this message
-            tx_id = get_db().get_tx_associated_with(message_id, chat_id)
+            tx_id = tx_ids_by_message_id.get(message_id)
             if tx_id:
-                # Get the updated transaction data from LunchMoney
-                updated_tx = lunch.get_transaction(tx_id)
-                if updated_tx:
-                    # Update the Telegram message with the latest transaction data
-                    await send_transaction_message(
-                        context, transaction=updated_tx, chat_id=chat_id, message_id=message_id
-                    )
-                    logger.info(f"Updated Telegram message {message_id} for transaction {tx_id} in chat {chat_id}")
-                else:
-                    logger.warning(f"Could not retrieve transaction data for transaction {tx_id} in chat {chat_id}")
+                async with semaphore:
+                    # Get the updated transaction data from LunchMoney
+                    updated_tx = await get_transaction_async(lunch, tx_id)
+                    if updated_tx:
+                        # Update the Telegram message with the latest transaction data
+                        await send_transaction_message(
+                            context, transaction=updated_tx, chat_id=chat_id, message_id=message_id
+                        )
+                        logger.info(f"Updated Telegram message {message_id} for transaction {tx_id} in chat {chat_id}")
+                    else:
+                        logger.warning(f"Could not retrieve transaction data for transaction {tx_id} in chat {chat_id}")
             else:
                 logger.warning(f"Could not find transaction ID for message {message_id} in chat {chat_id}")
         except Exception:
             logger.exception(f"Failed to update Telegram message {message_id} in chat {chat_id}")
 
+    await asyncio.gather(*(resync_message(message_id) for message_id in updated_message_ids))
+
 
 async def update_transaction_ids_for_posted_transactions(
     chat_id: int, posted_transactions: list[TransactionObject]
@@ -243,7 +290,8 @@ async def update_transaction_ids_for_posted_transactions(
 
     # Get all previously sent pending transactions for this chat
     two_weeks_ago = datetime.now() - timedelta(days=14)
-    sent_txs = get_db().get_sent_transactions(chat_id, since=two_weeks_ago) or []
+    db = get_db()
+    sent_txs = db.get_sent_transactions(chat_id, since=two_weeks_ago) or []
 
     if not sent_txs:
         logger.info(f"No sent transactions found for chat {chat_id} in the last two weeks")
@@ -261,6 +309,7 @@ async def update_transaction_ids_for_posted_transactions(
     logger.info(f"Found {len(posted_by_pending_id)} posted transactions with pending_transaction_id in chat {chat_id}")
 
     # Check each sent pending transaction to see if it needs to be updated
+    updates = []
     for sent_tx in sent_txs:
         if not sent_tx.plaid_id:
             logger.debug(f"Skipping sent pending transaction {sent_tx.tx_id} without plaid_id in chat {chat_id}")
@@ -276,16 +325,13 @@ async def update_transaction_ids_for_posted_transactions(
                 f"-> posted tx {posted_tx.id} (plaid_id: {new_plaid_id})"
             )
 
-            # Update the transaction record with the new IDs
-            success = get_db().update_transaction_ids_by_plaid_id(
-                old_plaid_id=sent_tx.plaid_id, new_tx_id=posted_tx.id, new_plaid_id=new_plaid_id
-            )
+            updates.append((sent_tx.plaid_id, posted_tx.id, new_plaid_id))
+            updated_message_ids.append(sent_tx.message_id)
 
-            if success:
-                logger.info(f"Successfully updated transaction record for {sent_tx.plaid_id}")
-                updated_message_ids.append(sent_tx.message_id)
-            else:
-                logger.warning(f"Failed to update transaction record for {sent_tx.plaid_id}")
+    # Update all the transaction records with their new IDs at once
+    if updates:
+        db.update_transaction_ids_by_plaid_ids(updates)
+        logger.info(f"Updated {len(updates)} transaction records with their posted IDs in chat {chat_id}")
 
     return updated_message_ids
 
@@ -309,7 +355,8 @@ async def mark_posted_txs_as_reviewed(
 
     # Get all previously sent pending transactions
     two_weeks_ago = datetime.now() - timedelta(days=14)
-    sent_txs = get_db().get_sent_transactions(chat_id, since=two_weeks_ago) or []
+    db = get_db()
+    sent_txs = db.get_sent_transactions(chat_id, since=two_weeks_ago) or []
     if not sent_txs:
         logger.info(f"No sent transactions found for chat {chat_id} in the last two weeks")
         return []
@@ -342,28 +389,39 @@ async def mark_posted_txs_as_reviewed(
         tx_to_process[sent_tx] = posted_tx
 
     logger.info(f"Found {len(tx_to_process)} transactions to mark as reviewed in chat {chat_id}")
+    semaphore = asyncio.Semaphore(POLL_UPDATES_CONCURRENCY)
+    # Load the messages associated with all the transactions at once
+    message_ids_by_tx_id = db.get_message_ids_for_tx_ids(
+        chat_id, [posted_tx.id for posted_tx in tx_to_process.values()]
+    )
 
-    # Check each sent transaction
-    for sent_tx, posted_tx in tx_to_process.items():
+    async def mark_as_reviewed(sent_tx, posted_tx) -> int | None:
         # Mark the found transaction as reviewed (transactions are pre-filtered to uncleared only)
         logger.info(
             f"Checking sent transaction {sent_tx.id} against posted transaction {posted_tx.id} with status {posted_tx.status}"
         )
         logger.info(f"Marking previously sent transaction {posted_tx.id} as reviewed")
         try:
-            lunch.update_transaction(
-                posted_tx.id,
-                TransactionUpdateObject(status=TransactionUpdateObject.StatusEnum.cleared),  # type: ignore
-            )
+            async with semaphore:
+                await asyncio.to_thread(
+                    lunch.update_transaction,
+                    posted_tx.id,
+                    TransactionUpdateObject(status=TransactionUpdateObject.StatusEnum.cleared),  # type: ignore
+                )
 
             # Also mark as reviewed in the db
-            get_db().mark_as_reviewed_by_tx_id(posted_tx.id, chat_id)
+            db.mark_as_reviewed_by_tx_id(posted_tx.id, chat_id)
 
-            msg_id = get_db().get_message_id_associated_with(posted_tx.id, chat_id)
-            if msg_id:
-                updated_message_ids.append(msg_id)
+            return message_ids_by_tx_id.get(posted_tx.id)
         except Exception:
             logger.exception(f"Failed to mark transaction {posted_tx.id} as reviewed")
+            return None
+
+    # Update the transactions in Lunch Money concurrently instead of one round trip after the other
+    msg_ids = await asyncio.gather(
+        *(mark_as_reviewed(sent_tx, posted_tx) for sent_tx, posted_tx in tx_to_process.items())
+    )
+    updated_message_ids = [msg_id for msg_id in msg_ids if msg_id]
 
     if not updated_message_ids:
         logger.info(f"No transactions were updated for chat {chat_id}")
@@ -398,7 +456,7 @@ async def handle_btn_confirm_delete_transaction(update: Update, _: ContextTypes.
     kbd = Keyboard()
     kbd += ("✅ Delete from Telegram and Lunch Money", f"deleteTx_{tx_id}")
     kbd += ("❌ Cancel", f"cancelDeleteTx_{tx_id}")
-    await query.answer()
+    # safe_edit_message_reply_markup answers the callback query
     await update.safe_edit_message_reply_markup(reply_markup=kbd.build(columns=1))
 
 
@@ -416,11 +474,10 @@ async def handle_btn_delete_transaction(update: Update, _: ContextTypes.DEFAULT_
     tx_id = int(update.callback_data_suffix)
     try:
         token = get_db().get_token(update.chat_id)
-        async with httpx.AsyncClient() as client:
-            response = await client.delete(
-                f"https://api.lunchmoney.dev/v2/transactions/{tx_id}", headers={"Authorization": f"Bearer {token}"}
-            )
-            response.raise_for_status()
+        response = await lunch_money_v2_client.delete(
+            f"{LUNCH_MONEY_V2_TRANSACTIONS_URL}/{tx_id}", headers={"Authorization": f"Bearer {token}"}
+        )
+        response.raise_for_status()
         logger.info(f"Deleted transaction {tx_id} from Lunch Money for chat {update.chat_id}")
     except Exception:
         logger.exception(f"Failed to delete transaction {tx_id} from Lunch Money for chat {update.chat_id}")
@@ -510,11 +567,12 @@ async def handle_btn_apply_category(update: Update, context: ContextTypes.DEFAUL
     transaction_id = int(transaction_id)
     lunch = get_lunch_client_for_chat_id(chat_id)
 
-    settings = get_db().get_current_settings(chat_id)
+    db = get_db()
+    settings = db.get_current_settings(chat_id)
     if settings.mark_reviewed_after_categorized:
         update_obj = TransactionUpdateObject(category_id=category_id, status=TransactionUpdateObject.StatusEnum.cleared)  # type: ignore
         lunch.update_transaction(transaction_id, update_obj)
-        get_db().mark_as_reviewed(query.message.message_id, chat_id)
+        db.mark_as_reviewed(query.message.message_id, chat_id)
     else:
         update_obj = TransactionUpdateObject(category_id=category_id)  # type: ignore
         lunch.update_transaction(transaction_id, update_obj)
@@ -552,15 +610,16 @@ async def handle_btn_mark_tx_as_reviewed(update: Update, context: ContextTypes.D
     chat_id = update.chat_id
     lunch = get_lunch_client_for_chat_id(chat_id)
     transaction_id = int(update.callback_data_suffix)
+    db = get_db()
     try:
         lunch.update_transaction(transaction_id, TransactionUpdateObject(status="cleared"))  # type: ignore
 
         # update message to show the right buttons
         updated_tx = lunch.get_transaction(transaction_id)
-        msg_id = get_db().get_message_id_associated_with(transaction_id, chat_id)
+        msg_id = db.get_message_id_associated_with(transaction_id, chat_id)
         await send_transaction_message(context, transaction=updated_tx, chat_id=chat_id, message_id=msg_id)
 
-        get_db().mark_as_reviewed(query.message.message_id, chat_id)
+        db.mark_as_reviewed(query.message.message_id, chat_id)
         await query.answer()
     except Exception as e:
         await query.answer(text=f"Error marking transaction as reviewed: {e!s}", show_alert=True)
@@ -575,6 +634,7 @@ async def handle_btn_mark_tx_as_unreviewed(update: Update, context: ContextTypes
     chat_id = update.chat_id
     lunch = get_lunch_client_for_chat_id(chat_id)
     transaction_id = int(update.callback_data_suffix)
+    db = get_db()
     try:
         logger.info(f"Marking transaction {transaction_id} as unreviewed")
         lunch.update_transaction(
@@ -584,10 +644,10 @@ async def handle_btn_mark_tx_as_unreviewed(update: Update, context: ContextTypes
 
         # update message to show the right buttons
         updated_tx = lunch.get_transaction(transaction_id)
-        msg_id = get_db().get_message_id_associated_with(transaction_id, chat_id)
+        msg_id = db.get_message_id_associated_with(transaction_id, chat_id)
         await send_transaction_message(context, transaction=updated_tx, chat_id=chat_id, message_id=msg_id)
 
-        get_db().mark_as_unreviewed(query.message.message_id, chat_id)
+        db.mark_as_unreviewed(query.message.message_id, chat_id)
         await query.answer()
     except Exception as e:
         await query.answer(text=f"Error marking transaction as reviewed: {e!s}", show_alert=True)
@@ -600,13 +660,16 @@ async def handle_message_reply(update: Update, context: ContextTypes.DEFAULT_TYP
 
     chat_id = update.chat_id
 
-    settings = get_db().get_current_settings(chat_id)
+    db = get_db()
+    settings = db.get_current_settings(chat_id)
     if settings is not None and settings.ai_agent:
-        # If AI Agent is enabled, we just pass the message to the AI handler
-        return await handle_generic_message_with_ai(update, context)
+        # If AI Agent is enabled, we just pass the message to the AI handler. The agent takes
+        # seconds, so it runs in the background instead of holding up every other update.
+        context.application.create_task(handle_generic_message_with_ai(update, context), update=update)
+        return None
 
     replying_to_msg_id = update.message.reply_to_message.message_id if update.message.reply_to_message else -1
-    tx_id = get_db().get_tx_associated_with(replying_to_msg_id, chat_id)
+    tx_id = db.get_tx_associated_with(replying_to_msg_id, chat_id)
 
     if tx_id is None:
         logger.error("No transaction ID found in bot data", exc_info=True)
@@ -622,15 +685,12 @@ async def handle_message_reply(update: Update, context: ContextTypes.DEFAULT_TYP
         return
 
     msg_text = update.message.text or ""
-    message_are_tags = True
-    for word in msg_text.split(" "):
-        if not word.startswith("#"):
-            message_are_tags = False
-            break
+    words = msg_text.split(" ")
+    message_are_tags = all(word.startswith("#") for word in words)
 
     lunch = get_lunch_client_for_chat_id(chat_id)
     if message_are_tags:
-        tags_without_hashtag = [tag[1:] for tag in msg_text.split(" ") if tag.startswith("#")]
+        tags_without_hashtag = [tag[1:] for tag in words]
         logger.info(f"Setting tags to transaction ({tx_id}): {tags_without_hashtag}")
         lunch.update_transaction(tx_id, TransactionUpdateObject(tags=tags_without_hashtag))  # type: ignore
     else:
@@ -644,7 +704,6 @@ async def handle_message_reply(update: Update, context: ContextTypes.DEFAULT_TYP
     updated_tx = lunch.get_transaction(tx_id)
     await send_transaction_message(context, transaction=updated_tx, chat_id=chat_id, message_id=replying_to_msg_id)
 
-    settings = get_db().get_current_settings(chat_id)
     if settings.auto_categorize_after_notes and not message_are_tags:
         await ai_categorize_transaction(tx_id, chat_id, context)
 
@@ -657,7 +716,7 @@ async def handle_btn_ai_categorize(update: Update, context: ContextTypes.DEFAULT
     tx_id = int(update.callback_data_suffix)
 
     chat_id = update.chat_id
-    response = categorize_transaction_with_agent(tx_id, chat_id)
+    response = await categorize_transaction_with_agent(tx_id, chat_id)
     if update.callback_query:
         await update.callback_query.answer(text=response, show_alert=True)
 
@@ -673,12 +732,13 @@ async def poll_transactions_on_schedule(context: ContextTypes.DEFAULT_TYPE):
     However, each chat can have its own polling settings, so we use this
     function to check the settings for each chat and decide whether to poll.
     """
-    chat_ids = get_db().get_all_registered_chats()
+    db = get_db()
+    chat_ids = db.get_all_registered_chats()
     if len(chat_ids) is None:
         logger.warning("No chats registered yet")
 
     for chat_id in chat_ids:
-        settings = get_db().get_current_settings(chat_id)
+        settings = db.get_current_settings(chat_id)
         if not settings:
             # technically this should never happen, but just in case
             logger.error(f"No settings found for chat {chat_id}!")
@@ -714,11 +774,11 @@ async def poll_transactions_on_schedule(context: ContextTypes.DEFAULT_TYPE):
                 # has revoked the access to the app.
                 # If that is the case, we should set the API token to TOKEN_REVOKED.
                 if "Access token does not exist" in str(e):
-                    get_db().set_api_token(chat_id, TOKEN_REVOKED)
+                    db.set_api_token(chat_id, TOKEN_REVOKED)
                     logger.exception(
                         f"User in chat {chat_id} has revoked access to the app. Setting API token to TOKEN_REVOKED."
                     )
-            get_db().update_last_poll_at(chat_id, datetime.now().isoformat())
+            db.update_last_poll_at(chat_id, datetime.now().isoformat())
 
 
 async def handle_expand_tx_options(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -737,12 +797,15 @@ async def handle_rename_payee(update: Update, context: ContextTypes.DEFAULT_TYPE
         return
 
     transaction_id = int(update.callback_data_suffix)
-    await update.callback_query.answer()
-    await context.bot.send_message(
-        chat_id=update.chat_id,
-        text="Please enter the new payee name:",
-        reply_to_message_id=update.callback_query.message.message_id,
-        reply_markup=ForceReply(),
+    # the answer and the prompt don't depend on each other
+    await asyncio.gather(
+        update.callback_query.answer(),
+        context.bot.send_message(
+            chat_id=update.chat_id,
+            text="Please enter the new payee name:",
+            reply_to_message_id=update.callback_query.message.message_id,
+            reply_markup=ForceReply(),
+        ),
     )
     set_expectation(
         update.chat_id,
@@ -759,17 +822,16 @@ async def handle_edit_notes(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     transaction_id = int(update.callback_data_suffix)
-    await update.callback_query.answer()
-    await context.bot.send_message(
-        chat_id=update.chat_id,
-        text=dedent(
-            """
-            Please enter notes for this transaction.\n\n
-            *Hint:* _you can also reply to the transaction message to edit its notes._"""
+    # the answer and the prompt don't depend on each other
+    await asyncio.gather(
+        update.callback_query.answer(),
+        context.bot.send_message(
+            chat_id=update.chat_id,
+            text=EDIT_NOTES_PROMPT_TEXT,
+            reply_to_message_id=update.callback_query.message.message_id,
+            parse_mode=ParseMode.MARKDOWN,
+            reply_markup=ForceReply(),
         ),
-        reply_to_message_id=update.callback_query.message.message_id,
-        parse_mode=ParseMode.MARKDOWN,
-        reply_markup=ForceReply(),
     )
     set_expectation(
         update.chat_id,
@@ -786,19 +848,16 @@ async def handle_set_tags(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     transaction_id = int(update.callback_data_suffix)
-    await update.callback_query.answer()
-    await context.bot.send_message(
-        chat_id=update.chat_id,
-        text=dedent(
-            """
-            Please enter the tags for this transaction\n\n
-            💡 *Hint:* _you can also reply to the transaction message to edit its tags
-            if the message contains only tags like this: #tag1 #tag2 #etc_
-            """
+    # the answer and the prompt don't depend on each other
+    await asyncio.gather(
+        update.callback_query.answer(),
+        context.bot.send_message(
+            chat_id=update.chat_id,
+            text=SET_TAGS_PROMPT_TEXT,
+            reply_to_message_id=update.callback_query.message.message_id,
+            parse_mode=ParseMode.MARKDOWN,
+            reply_markup=ForceReply(),
         ),
-        reply_to_message_id=update.callback_query.message.message_id,
-        parse_mode=ParseMode.MARKDOWN,
-        reply_markup=ForceReply(),
     )
     set_expectation(
         update.chat_id,
@@ -1,11 +1,15 @@
 import os
 
 from lunchable import LunchMoney
+from lunchable.models import TransactionObject
 
 from errors import NoLunchTokenError
 from persistence import get_db
 
-lunch_clients_cache: dict[int, LunchMoney] = {}
+# chat_id -> (token, client). Clients are reused across requests so they keep their
+# pooled HTTP connections; the token is stored alongside so a new token (re-login,
+# revocation) transparently gets a new client.
+lunch_clients_cache: dict[int, tuple[str | None, LunchMoney]] = {}
 
 TEST_CHAT_ID = 123456789
 
@@ -16,17 +20,33 @@ def get_lunch_client(token: str) -> LunchMoney:
 
 def get_lunch_client_for_chat_id(chat_id: int) -> LunchMoney:
     if chat_id == TEST_CHAT_ID:
-        test_token = os.environ.get("TEST_LUNCH_TOKEN")
-        return get_lunch_client(test_token)
-    if chat_id in lunch_clients_cache:
-        return lunch_clients_cache[chat_id]
-
-    token = get_db().get_token(chat_id)
-    if token is None:
-        raise NoLunchTokenError("No token registered")
-
-    lunch_clients_cache[chat_id] = get_lunch_client(token)
-    return lunch_clients_cache[chat_id]
+        token = os.environ.get("TEST_LUNCH_TOKEN")
+    else:
+        # settings are served from memory, so this doesn't hit the database on every call
+        token = get_db().get_current_settings(chat_id).token
+        if token is None:
+            raise NoLunchTokenError("No token registered")
+
+    cached = lunch_clients_cache.get(chat_id)
+    if cached is not None and cached[0] == token:
+        return cached[1]
+
+    client = get_lunch_client(token)
+    lunch_clients_cache[chat_id] = (token, client)
+    return client
+
+
+async def get_transaction_async(lunch: LunchMoney, transaction_id: int) -> TransactionObject:
+    """Async equivalent of lunch.get_transaction.
+
+    lunchable only offers blocking calls for transactions, but its clients also keep a
+    pooled httpx.AsyncClient, so this lets several transactions be fetched concurrently
+    from the event loop without tying up a worker thread per request.
+    """
+    # same request as LunchMoney.get_transaction (GET /v1/transactions/{id}), built on the public
+    # amake_request instead of lunchable's private API config
+    response_data = await lunch.amake_request(method=lunch.Methods.GET, url_path=["transactions", transaction_id])
+    return TransactionObject.model_validate(response_data)
 
 
 def get_lunch_money_token_for_chat_id(chat_id: int) -> str:
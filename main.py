@@ -98,11 +98,15 @@ from handlers.transactions import (
 )
 from lunch import get_lunch_client_for_chat_id
 from manual_tx import handle_manual_tx, handle_web_app_data
+from metrics_writer import run_metrics_writer
 from telegram_extensions import Update
 from tx_messaging import send_transaction_message
 from web_server import run_web_server, set_bot_instance, update_bot_status
 
-logging.basicConfig(level=logging.DEBUG, format="%(asctime)s [%(name)s] %(levelname%s: %(message)s")
+# The only place logging is configured; modules just create their loggers
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(), format="%(asctime)s [%(name)s] %(levelname)s: %(message)s"
+)
 logger = logging.getLogger("lonchera")
 
 logging.getLogger("httpx").setLevel(logging.WARNING)
@@ -190,7 +194,7 @@ def add_application_callback_query_handlers(app):
     app.add_handler(CallbackQueryHandler(handle_btn_collapse_transaction, pattern=r"^collapse_"))
     app.add_handler(CallbackQueryHandler(handle_btn_cancel_categorization, pattern=r"^cancelCategorization_"))
     app.add_handler(CallbackQueryHandler(handle_btn_show_categories, pattern=r"^categorize_"))
-    app.add_handler(CallbackQueryHandler(handle_btn_ai_categorize, pattern=r"^aicategorize_"))
+    app.add_handler(CallbackQueryHandler(handle_btn_ai_categorize, pattern=r"^aicategorize_", block=False))
     app.add_handler(CallbackQueryHandler(handle_btn_show_subcategories, pattern=r"^subcategorize_"))
     app.add_handler(CallbackQueryHandler(handle_btn_apply_category, pattern=r"^applyCategory_"))
     app.add_handler(CallbackQueryHandler(handle_btn_dump_plaid_details, pattern=r"^plaid_"))
@@ -255,10 +259,15 @@ def setup_handlers(config):
     if app.job_queue:
         app.job_queue.run_repeating(poll_transactions_on_schedule, interval=60, first=5)
 
+    # Text handlers stay blocking since they also drive the expectation flows (token, notes, tags,
+    # time zone), which must run in order; they hand the AI agent off to a background task themselves.
+    # Voice messages always go to the agent, so block=False runs them as background tasks that don't
+    # hold up the updates of every other chat; the agent's own semaphore (LLM_MAX_CONCURRENCY) bounds
+    # how many run at once.
     app.add_handler(MessageHandler(filters.TEXT & filters.REPLY, handle_message_reply))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.REPLY, handle_generic_message))
     app.add_handler(MessageHandler(filters.Document.ALL, handle_file_upload))
-    app.add_handler(MessageHandler((filters.VOICE | filters.AUDIO), handle_audio_transcription))
+    app.add_handler(MessageHandler((filters.VOICE | filters.AUDIO), handle_audio_transcription, block=False))
     app.add_handler(MessageHandler(filters.StatusUpdate.WEB_APP_DATA, handle_web_app_data))
 
     logger.info("Telegram handlers set up successfully")
@@ -267,6 +276,8 @@ def setup_handlers(config):
 
 
 def load_config():
+    # .env is loaded only after every module is imported, so settings read from the environment are
+    # parsed lazily on first use (lru_cache'd getters) instead of into module-level constants
     load_dotenv()
 
     return {
@@ -337,6 +348,7 @@ async def main():
         await app.initialize()
         await app.start()
         update_bot_status(True)  # Mark as running when started
+        metrics_writer_task = asyncio.create_task(run_metrics_writer())
         if app.updater:
             await app.updater.start_polling(allowed_updates=Update.ALL_TYPES, error_callback=error_callback)
 
@@ -351,6 +363,8 @@ async def main():
             if app.updater:
                 await app.updater.stop()
             await app.stop()
+            metrics_writer_task.cancel()
+            await asyncio.gather(metrics_writer_task, return_exceptions=True)
 
 
 if __name__ == "__main__":
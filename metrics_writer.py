@@ -0,0 +1,57 @@
+"""
+Buffers metric increments in memory and writes them to the database in batches.
+
+Metrics are not something users wait for, so hot paths enqueue their increments
+here instead of committing to SQLite on every call. A background task flushes
+the buffer every FLUSH_INTERVAL_SECS with a single inc_metrics_many transaction.
+"""
+
+import asyncio
+import atexit
+import logging
+from collections import defaultdict
+
+from persistence import get_db
+
+logger = logging.getLogger("metrics_writer")
+
+FLUSH_INTERVAL_SECS = 1.0
+
+pending_metrics: defaultdict[str, float] = defaultdict(float)
+
+
+def enqueue_metric(key: str, increment: float = 1.0) -> None:
+    """Adds an increment to the buffer; it will be persisted on the next flush."""
+    pending_metrics[key] += increment
+
+
+def enqueue_metrics(increments: dict[str, float]) -> None:
+    """Adds several increments to the buffer at once."""
+    for key, increment in increments.items():
+        pending_metrics[key] += increment
+
+
+def flush_metrics() -> None:
+    """Writes all buffered increments to the database in a single transaction."""
+    if not pending_metrics:
+        return
+    batch = dict(pending_metrics)
+    pending_metrics.clear()
+    try:
+        get_db().inc_metrics_many(batch)
+    except Exception:
+        logger.exception("Failed to flush %d metrics", len(batch))
+
+
+async def run_metrics_writer() -> None:
+    """Flushes the buffer periodically until cancelled, then flushes one last time."""
+    try:
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL_SECS)
+            flush_metrics()
+    finally:
+        flush_metrics()
+
+
+# scripts that never start the writer task (and abrupt shutdowns) still persist their metrics
+atexit.register(flush_metrics)
@@ -1,8 +1,25 @@
 import logging
 import os
+import time
+from collections.abc import Iterable
 from datetime import datetime, timedelta
-
-from sqlalchemy import Boolean, DateTime, Float, Integer, String, and_, create_engine, delete, func, update
+from functools import lru_cache
+
+from sqlalchemy import (
+    Boolean,
+    DateTime,
+    Float,
+    Integer,
+    String,
+    and_,
+    bindparam,
+    create_engine,
+    delete,
+    event,
+    func,
+    select,
+    update,
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import Mapped, mapped_column, sessionmaker
 
@@ -11,6 +28,9 @@ from errors import NoLunchTokenError
 
 logger = logging.getLogger("db")
 
+# How long a chat's settings are served from memory before hitting the database again
+SETTINGS_CACHE_TTL_SECS = 300
+
 Base = declarative_base()
 
 
@@ -112,10 +132,73 @@ class Analytics(Base):
     value: Mapped[float] = mapped_column(Float, default=0.0, nullable=False)
 
 
+def configure_sqlite_connection(dbapi_connection, _connection_record) -> None:
+    # WAL lets handlers keep reading while the poller or the metrics writer commits, instead of
+    # every access serializing on the database lock; NORMAL sync is safe with WAL and skips an fsync per commit
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+@lru_cache(maxsize=256)
+def parse_ignored_accounts(ignored_accounts: str) -> frozenset[int]:
+    """Parse the comma-separated ignored_accounts column. Cached because the poller reads it every interval."""
+    account_ids = set()
+    for raw_account_id in ignored_accounts.split(","):
+        account_id_str = raw_account_id.strip()
+        if account_id_str:  # Skip empty strings
+            try:
+                account_id = int(account_id_str)
+                if account_id > 0:  # Only include positive account IDs
+                    account_ids.add(account_id)
+            except ValueError:
+                # Log malformed account ID but continue processing
+                logger.warning(f"Malformed account ID '{account_id_str}' in ignored_accounts")
+                continue
+    return frozenset(account_ids)
+
+
 class Persistence:
     def __init__(self, db_path: str):
+        # get_db() keeps a single instance, so the engine's connection pool is shared by every caller
         self.engine = create_engine(f"sqlite:///{db_path}")
+        event.listen(self.engine, "connect", configure_sqlite_connection)
         self.Session = sessionmaker(bind=self.engine)
+        # chat_id -> (expires_at, settings). Every method that writes to the settings
+        # table must call _invalidate_settings so readers never see stale values.
+        self._settings_cache: dict[int, tuple[float, Settings]] = {}
+
+    def _invalidate_settings(self, chat_id: str | int) -> None:
+        self._settings_cache.pop(int(chat_id), None)
+
+    def _update_settings(self, chat_id: int, **values) -> Settings | None:
+        """Update the given columns of a chat's settings in a single UPDATE ... RETURNING.
+
+        The returned row replaces the cached copy, so rendering it needs no further reads.
+        Returns None if the chat has no settings.
+        """
+        # expire_on_commit=False keeps the returned object's attributes loaded once the session closes
+        with self.Session(expire_on_commit=False) as session:
+            stmt = update(Settings).where(Settings.chat_id == chat_id).values(**values).returning(Settings)
+            settings = session.scalars(stmt).one_or_none()
+            session.commit()
+        if settings is None:
+            self._invalidate_settings(chat_id)
+        else:
+            self._settings_cache[int(chat_id)] = (time.monotonic() + SETTINGS_CACHE_TTL_SECS, settings)
+        return settings
+
+    def _update_existing_settings(self, chat_id: int, **values) -> Settings:
+        """Like _update_settings, but raises NoLunchTokenError if the chat has no settings."""
+        settings = self._update_settings(chat_id, **values)
+        if settings is None:
+            raise NoLunchTokenError("No settings found")
+        return settings
+
+    def _toggle_setting(self, chat_id: int, column) -> Settings:
+        """Flip a boolean column in the database and return the updated settings."""
+        return self._update_existing_settings(chat_id, **{column.key: ~column})
 
     def save_token(self, chat_id: int, token: str):
         with self.Session() as session:
@@ -125,6 +208,7 @@ class Persistence:
                 new_setting = Settings(chat_id=chat_id, token=token)
                 session.add(new_setting)
             session.commit()
+            self._invalidate_settings(chat_id)
 
     def get_token(self, chat_id) -> str | None:
         with self.Session() as session:
@@ -139,6 +223,14 @@ class Persistence:
         with self.Session() as session:
             return session.query(Transaction.message_id).filter_by(tx_id=tx_id).first() is not None
 
+    def get_already_sent_tx_ids(self, tx_ids: Iterable[int]) -> set[int]:
+        """Returns which of the given transactions were already sent, with a single query."""
+        tx_ids = list(tx_ids)
+        if not tx_ids:
+            return set()
+        with self.Session() as session:
+            return set(session.scalars(select(Transaction.tx_id).where(Transaction.tx_id.in_(tx_ids))))
+
     def mark_as_sent(
         self,
         tx_id: int,
@@ -161,11 +253,49 @@ class Persistence:
             session.add(new_transaction)
             session.commit()
 
+    def mark_as_sent_many(self, rows: list[tuple[int, int, int, str | None, bool, str | None]]) -> None:
+        """Record several sent transaction messages in a single transaction.
+
+        Args:
+            rows: (tx_id, chat_id, message_id, recurring_type, reviewed, plaid_id) tuples,
+                  with the same meaning as the arguments of mark_as_sent
+        """
+        if not rows:
+            return
+        logger.info(f"Marking {len(rows)} transactions as sent")
+        now = datetime.now()
+        with self.Session() as session:
+            session.add_all(
+                Transaction(
+                    message_id=message_id,
+                    tx_id=tx_id,
+                    chat_id=chat_id,
+                    recurring_type=recurring_type,
+                    reviewed_at=now if reviewed else None,
+                    plaid_id=plaid_id,
+                )
+                for tx_id, chat_id, message_id, recurring_type, reviewed, plaid_id in rows
+            )
+            session.commit()
+
     def get_tx_associated_with(self, message_id: int, chat_id: int) -> int | None:
         with self.Session() as session:
             transaction = session.query(Transaction.tx_id).filter_by(message_id=message_id, chat_id=chat_id).first()
             return transaction.tx_id if transaction else None
 
+    def get_tx_ids_for_message_ids(self, chat_id: int, message_ids: Iterable[int]) -> dict[int, int]:
+        """Returns a message_id -> tx_id map for the given messages, with a single query."""
+        message_ids = list(message_ids)
+        if not message_ids:
+            return {}
+        with self.Session() as session:
+            rows = session.execute(
+                select(Transaction.message_id, Transaction.tx_id).where(
+                    Transaction.chat_id == chat_id, Transaction.message_id.in_(message_ids)
+                )
+            )
+            return dict(rows.tuples().all())
+
     def get_tx_by_id(self, tx_id: int) -> Transaction | None:
         with self.Session() as session:
             return session.query(Transaction).filter_by(tx_id=tx_id).first()
@@ -184,6 +314,22 @@ class Persistence:
             )
             return transaction.message_id if transaction else None
 
+    def get_message_ids_for_tx_ids(self, chat_id: int, tx_ids: Iterable[int]) -> dict[int, int]:
+        """Returns a tx_id -> message_id map for the given transactions, with a single query.
+
+        Like get_message_id_associated_with, the most recent message wins when a transaction was sent more than once.
+        """
+        tx_ids = list(tx_ids)
+        if not tx_ids:
+            return {}
+        with self.Session() as session:
+            rows = session.execute(
+                select(Transaction.tx_id, Transaction.message_id)
+                .where(Transaction.chat_id == chat_id, Transaction.tx_id.in_(tx_ids))
+                .order_by(Transaction.created_at)
+            )
+            return dict(rows.tuples().all())
+
     def delete_transactions_for_chat(self, chat_id: int):
         with self.Session() as session:
             stmt = delete(Transaction).where(Transaction.chat_id == chat_id)
@@ -222,17 +368,19 @@ class Persistence:
             session.commit()
 
     def get_current_settings(self, chat_id: str | int) -> Settings:
+        cached = self._settings_cache.get(int(chat_id))
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
         with self.Session() as session:
             settings = session.query(Settings).filter_by(chat_id=chat_id).first()
             if settings is None:
                 raise NoLunchTokenError("No settings found")
+            self._settings_cache[int(chat_id)] = (time.monotonic() + SETTINGS_CACHE_TTL_SECS, settings)
             return settings
 
-    def update_poll_interval(self, chat_id: int, interval: int) -> None:
-        with self.Session() as session:
-            stmt = update(Settings).where(Settings.chat_id == chat_id).values(poll_interval_secs=interval)
-            session.execute(stmt)
-            session.commit()
+    def update_poll_interval(self, chat_id: int, interval: int) -> Settings:
+        return self._update_existing_settings(chat_id, poll_interval_secs=interval)
 
     def update_last_poll_at(self, chat_id: int, timestamp: str) -> None:
         with self.Session() as session:
@@ -243,147 +391,130 @@ class Persistence:
             )
             session.execute(stmt)
             session.commit()
+            self._invalidate_settings(chat_id)
 
     def logout(self, chat_id: int) -> None:
         with self.Session() as session:
             session.query(Settings).filter_by(chat_id=chat_id).delete()
             session.query(Transaction).filter_by(chat_id=chat_id).delete()
             session.commit()
+            self._invalidate_settings(chat_id)
 
     def update_auto_mark_reviewed(self, chat_id: int, auto_mark_reviewed: bool) -> None:
-        with self.Session() as session:
-            stmt = update(Settings).where(Settings.chat_id == chat_id).values(auto_mark_reviewed=auto_mark_reviewed)
-            session.execute(stmt)
-            session.commit()
+        self._update_settings(chat_id, auto_mark_reviewed=auto_mark_reviewed)
 
     def update_poll_pending(self, chat_id: int, poll_pending: bool) -> None:
-        with self.Session() as session:
-            stmt = update(Settings).where(Settings.chat_id == chat_id).values(poll_pending=poll_pending)
-            session.execute(stmt)
-            session.commit()
+        self._update_settings(chat_id, poll_pending=poll_pending)
 
     def update_show_datetime(self, chat_id: int, show_datetime: bool) -> None:
-        with self.Session() as session:
-            stmt = update(Settings).where(Settings.chat_id == chat_id).values(show_datetime=show_datetime)
-            session.execute(stmt)
-            session.commit()
+        self._update_settings(chat_id, show_datetime=show_datetime)
 
     def update_tagging(self, chat_id: int, tagging: bool) -> None:
-        with self.Session() as session:
-            stmt = update(Settings).where(Settings.chat_id == chat_id).values(tagging=tagging)
-            session.execute(stmt)
-            session.commit()
+        self._update_settings(chat_id, tagging=tagging)
 
     def update_mark_reviewed_after_categorized(self, chat_id: int, value: bool) -> None:
-        with self.Session() as session:
-            stmt = update(Settings).where(Settings.chat_id == chat_id).values(mark_reviewed_after_categorized=value)
-            session.execute(stmt)
-            session.commit()
+        self._update_settings(chat_id, mark_reviewed_after_categorized=value)
 
-    def update_timezone(self, chat_id: int, timezone: str) -> None:
-        with self.Session() as session:
-            stmt = update(Settings).where(Settings.chat_id == chat_id).values(timezone=timezone)
-            session.execute(stmt)
-            session.commit()
+    def update_timezone(self, chat_id: int, timezone: str) -> Settings:
+        return self._update_existing_settings(chat_id, timezone=timezone)
 
     def update_auto_categorize_after_notes(self, chat_id: int, value: bool) -> None:
-        with self.Session() as session:
-            stmt = update(Settings).where(Settings.chat_id == chat_id).values(auto_categorize_after_notes=value)
-            session.execute(stmt)
-            session.commit()
+        self._update_settings(chat_id, auto_categorize_after_notes=value)
 
     def update_ai_agent(self, chat_id: int, ai_agent: bool) -> None:
-        with self.Session() as session:
-            stmt = update(Settings).where(Settings.chat_id == chat_id).values(ai_agent=ai_agent)
-            session.execute(stmt)
-            session.commit()
+        self._update_settings(chat_id, ai_agent=ai_agent)
 
     def update_show_transcription(self, chat_id: int, show_transcription: bool) -> None:
-        with self.Session() as session:
-            stmt = update(Settings).where(Settings.chat_id == chat_id).values(show_transcription=show_transcription)
-            session.execute(stmt)
-            session.commit()
+        self._update_settings(chat_id, show_transcription=show_transcription)
 
-    def update_ai_response_language(self, chat_id: int, language: str | None) -> None:
-        with self.Session() as session:
-            stmt = update(Settings).where(Settings.chat_id == chat_id).values(ai_response_language=language)
-            session.execute(stmt)
-            session.commit()
+    def update_ai_response_language(self, chat_id: int, language: str | None) -> Settings:
+        return self._update_existing_settings(chat_id, ai_response_language=language)
 
     def update_ai_model(self, chat_id: int, model: str | None) -> None:
-        with self.Session() as session:
-            stmt = update(Settings).where(Settings.chat_id == chat_id).values(ai_model=model)
-            session.execute(stmt)
-            session.commit()
+        self._update_settings(chat_id, ai_model=model)
 
     def update_compact_view(self, chat_id: int, compact_view: bool) -> None:
-        with self.Session() as session:
-            stmt = update(Settings).where(Settings.chat_id == chat_id).values(compact_view=compact_view)
-            session.execute(stmt)
-            session.commit()
+        self._update_settings(chat_id, compact_view=compact_view)
 
     def update_sync_delete_with_lunchmoney(self, chat_id: int, value: bool) -> None:
-        with self.Session() as session:
-            stmt = update(Settings).where(Settings.chat_id == chat_id).values(sync_delete_with_lunchmoney=value)
-            session.execute(stmt)
-            session.commit()
+        self._update_settings(chat_id, sync_delete_with_lunchmoney=value)
+
+    def toggle_poll_pending(self, chat_id: int) -> Settings:
+        return self._toggle_setting(chat_id, Settings.poll_pending)
+
+    def toggle_show_datetime(self, chat_id: int) -> Settings:
+        return self._toggle_setting(chat_id, Settings.show_datetime)
+
+    def toggle_tagging(self, chat_id: int) -> Settings:
+        return self._toggle_setting(chat_id, Settings.tagging)
+
+    def toggle_compact_view(self, chat_id: int) -> Settings:
+        return self._toggle_setting(chat_id, Settings.compact_view)
+
+    def toggle_auto_mark_reviewed(self, chat_id: int) -> Settings:
+        return self._toggle_setting(chat_id, Settings.auto_mark_reviewed)
+
+    def toggle_mark_reviewed_after_categorized(self, chat_id: int) -> Settings:
+        return self._toggle_setting(chat_id, Settings.mark_reviewed_after_categorized)
 
-    def update_ignored_accounts(self, chat_id: int, ignored_account_ids: list[int]) -> None:
-        """Store list of account IDs as comma-separated string in the database.
+    def toggle_auto_categorize_after_notes(self, chat_id: int) -> Settings:
+        return self._toggle_setting(chat_id, Settings.auto_categorize_after_notes)
+
+    def toggle_sync_delete_with_lunchmoney(self, chat_id: int) -> Settings:
+        return self._toggle_setting(chat_id, Settings.sync_delete_with_lunchmoney)
+
+    def toggle_ai_agent(self, chat_id: int) -> Settings:
+        return self._toggle_setting(chat_id, Settings.ai_agent)
+
+    def toggle_show_transcription(self, chat_id: int) -> Settings:
+        return self._toggle_setting(chat_id, Settings.show_transcription)
+
+    def update_ignored_accounts(self, chat_id: int, ignored_account_ids: Iterable[int]) -> None:
+        """Store account IDs as comma-separated string in the database.
 
         Args:
             chat_id: The chat ID to update ignored accounts for
-            ignored_account_ids: List of account IDs to ignore for transaction notifications
+            ignored_account_ids: Account IDs to ignore for transaction notifications
         """
-        # Convert list of integers to comma-separated string
-        ignored_accounts_str = (
-            ",".join(str(account_id) for account_id in ignored_account_ids) if ignored_account_ids else ""
-        )
+        # Convert integers to comma-separated string, sorted so that sets are stored deterministically
+        ignored_accounts_str = ",".join(str(account_id) for account_id in sorted(ignored_account_ids))
 
-        with self.Session() as session:
-            stmt = update(Settings).where(Settings.chat_id == chat_id).values(ignored_accounts=ignored_accounts_str)
-            session.execute(stmt)
-            session.commit()
+        self._update_settings(chat_id, ignored_accounts=ignored_accounts_str)
+
+    def toggle_ignored_account(self, chat_id: int, account_id: int) -> set[int]:
+        """Flip whether an account is ignored for transaction notifications.
 
-    def get_ignored_accounts_list(self, chat_id: int) -> list[int]:
-        """Parse comma-separated string into list of integers.
+        Returns:
+            The updated set of ignored account IDs
+        """
+        ignored_accounts = self.get_ignored_accounts_set(chat_id)
+        ignored_accounts ^= {account_id}
+        self.update_ignored_accounts(chat_id, ignored_accounts)
+        return ignored_accounts
+
+    def get_ignored_accounts_set(self, chat_id: int) -> set[int]:
+        """Parse comma-separated string into a set of integers.
 
         Args:
             chat_id: The chat ID to get ignored accounts for
 
         Returns:
-            List of account IDs that should be ignored for transaction notifications
+            Set of account IDs that should be ignored for transaction notifications
         """
-        with self.Session() as session:
-            settings = session.query(Settings).filter_by(chat_id=chat_id).first()
+        try:
+            settings = self.get_current_settings(chat_id)
+        except NoLunchTokenError:
+            return set()
 
-            # Handle case where settings don't exist or ignored_accounts is None/empty
-            if not settings or not settings.ignored_accounts:
-                return []
-
-            # Parse comma-separated string, handling edge cases
-            ignored_accounts = []
-            for raw_account_id in settings.ignored_accounts.split(","):
-                account_id_str = raw_account_id.strip()
-                if account_id_str:  # Skip empty strings
-                    try:
-                        account_id = int(account_id_str)
-                        if account_id > 0:  # Only include positive account IDs
-                            ignored_accounts.append(account_id)
-                    except ValueError:
-                        # Log malformed account ID but continue processing
-                        logger.warning(
-                            f"Malformed account ID '{account_id_str}' in ignored_accounts for chat {chat_id}"
-                        )
-                        continue
-
-            return ignored_accounts
+        # Handle case where ignored_accounts is None/empty
+        if not settings.ignored_accounts:
+            return set()
+
+        # Callers are free to modify the returned set, so the cached parse is copied
+        return set(parse_ignored_accounts(settings.ignored_accounts))
 
     def set_api_token(self, chat_id: int, token: str | None) -> None:
-        with self.Session() as session:
-            stmt = update(Settings).where(Settings.chat_id == chat_id).values(token=token)
-            session.execute(stmt)
-            session.commit()
+        self._update_settings(chat_id, token=token)
 
     def inc_metric(self, key: str, increment: float = 1.0, date: datetime | None = None):
         if date is None:
@@ -400,6 +531,30 @@ class Persistence:
                 session.add(metric)
             session.commit()
 
+    def inc_metrics_many(self, increments: dict[str, float], date: datetime | None = None):
+        """Apply several metric increments in a single transaction."""
+        if not increments:
+            return
+        if date is None:
+            date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        else:
+            date = date.replace(hour=0, minute=0, second=0, microsecond=0)
+
+        with self.Session() as session:
+            existing = {
+                metric.key: metric
+                for metric in session.query(Analytics).filter(
+                    Analytics.key.in_(increments.keys()), Analytics.date == date
+                )
+            }
+            for key, increment in increments.items():
+                metric = existing.get(key)
+                if metric:
+                    metric.value = metric.value + increment
+                else:
+                    session.add(Analytics(key=key, date=date, value=increment))
+            session.commit()
+
     def get_metric(self, key: str, start_date: datetime, end_date: datetime) -> float:
         with self.Session() as session:
             result = (
@@ -462,6 +617,7 @@ class Persistence:
             stmt = update(Settings).where(Settings.chat_id == chat_id).values(token=TOKEN_BLOCKED)
             session.execute(stmt)
             session.commit()
+            self._invalidate_settings(chat_id)
             logger.info(f"User {chat_id} marked as blocked")
 
     def get_blocked_users(self) -> list[int]:
@@ -525,6 +681,7 @@ class Persistence:
 
             # Commit the transaction
             session.commit()
+            self._invalidate_settings(chat_id)
 
             logger.info(
                 f"Deleted user data for chat_id {chat_id}: {transaction_count} transactions, {settings_count} settings"
@@ -557,17 +714,30 @@ class Persistence:
                 session.query(Transaction).filter(Transaction.chat_id == chat_id, Transaction.created_at >= since).all()
             )
 
-    def update_transaction_ids_by_plaid_id(self, old_plaid_id: str, new_tx_id: int, new_plaid_id: str | None) -> bool:
-        """Update transaction tx_id and plaid_id by matching old plaid_id."""
+    def update_transaction_ids_by_plaid_ids(self, updates: list[tuple[str, int, str | None]]) -> None:
+        """Update transactions' tx_id and plaid_id by matching their old plaid_id, in a single transaction.
+
+        Args:
+            updates: (old_plaid_id, new_tx_id, new_plaid_id) tuples
+        """
+        if not updates:
+            return
+        # executemany needs a Core statement, since ORM bulk updates only match rows by primary key
+        transactions = Transaction.__table__
+        stmt = (
+            update(transactions)
+            .where(transactions.c.plaid_id == bindparam("old_plaid_id"))
+            .values(tx_id=bindparam("new_tx_id"), plaid_id=bindparam("new_plaid_id"))
+        )
         with self.Session() as session:
-            stmt = (
-                update(Transaction)
-                .where(Transaction.plaid_id == old_plaid_id)
-                .values(tx_id=new_tx_id, plaid_id=new_plaid_id)
+            session.connection().execute(
+                stmt,
+                [
+                    {"old_plaid_id": old_plaid_id, "new_tx_id": new_tx_id, "new_plaid_id": new_plaid_id}
+                    for old_plaid_id, new_tx_id, new_plaid_id in updates
+                ],
             )
-            result = session.execute(stmt)
             session.commit()
-            return result.rowcount > 0
 
 
 db = None
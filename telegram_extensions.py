@@ -6,13 +6,16 @@ by monkey-patching them with additional properties while maintaining
 full type safety through proper type annotations.
 """
 
+import asyncio
+import hashlib
+from datetime import datetime
 from typing import TYPE_CHECKING
 
+from telegram import CallbackQuery, Message
 from telegram import Update as TelegramUpdate
+from telegram.error import BadRequest
 
 if TYPE_CHECKING:
-    from telegram._message import Message
-
     # For type checking, we create a proper class that extends Update
     class Update(TelegramUpdate):
         """Extended Update class with additional properties for type checking."""
@@ -136,15 +139,42 @@ else:
         Raises:
             ValueError: If effective_chat is None or if the chat ID is not available
         """
-        if self.effective_chat is None:
+        # effective_chat is a property, look it up only once
+        effective_chat = self.effective_chat
+        if effective_chat is None:
             raise ValueError("No effective chat found in update")
 
-        chat_id = self.effective_chat.id
+        chat_id = effective_chat.id
         if chat_id is None:
             raise ValueError("Chat ID is None")
 
         return chat_id
 
+    # (chat_id, message_id) -> (digests of the last text and keyboard rendered by safe_edit_message_text, edit date)
+    last_renders: dict[tuple[int, int], tuple[bytes, bytes, datetime | None]] = {}
+    MAX_TRACKED_RENDERS = 4096
+
+    def _digest(content: str) -> bytes:
+        return hashlib.blake2b(content.encode(), digest_size=16).digest()
+
+    def _render_digests(
+        text: str, parse_mode: str | None, reply_markup, disable_web_page_preview, kwargs: dict
+    ) -> tuple[bytes, bytes]:
+        """Digests of the body and of the keyboard of an edit, used to detect which parts would change."""
+        text_digest = _digest(f"{text}|{parse_mode}|{disable_web_page_preview}|{sorted(kwargs.items())!r}")
+        markup_digest = _digest(reply_markup.to_json() if reply_markup is not None else "")
+        return text_digest, markup_digest
+
+    async def _answer_callback_query(
+        callback_query: CallbackQuery, text: str | None = None, show_alert: bool = False
+    ) -> None:
+        """Answers a callback query, ignoring failures (e.g. the query being too old)."""
+        try:
+            await callback_query.answer(text=text, show_alert=show_alert)
+        except Exception:
+            # does not matter much
+            ...
+
     async def _safe_edit_message_text(
         self: TelegramUpdate,
         text: str | None = None,
@@ -160,6 +190,7 @@ else:
         - Does nothing if callback_query is None
         - Automatically calls answer() on the callback query
         - Does nothing if text is None
+        - Only edits the keyboard if the text is the same as in the last render
 
         Args:
             text: New text of the message (does nothing if None)
@@ -180,21 +211,43 @@ else:
         if text is None:
             return True
 
-        # Edit the message text and return the result
-        result = await self.callback_query.edit_message_text(
-            text=text,
-            parse_mode=parse_mode,
-            reply_markup=reply_markup,
-            disable_web_page_preview=disable_web_page_preview,
-            **kwargs,
-        )
-
-        # Answer the callback query first
+        # Compare with what we rendered last time to only send what changed: nothing when the message
+        # still shows exactly that (e.g. a toggle tapped twice), just the keyboard when the body is the
+        # same. The edit date tells whether anything else edited the message since then.
+        message = self.callback_query.message
+        render_key = (message.chat.id, message.message_id) if message else None
+        text_digest, markup_digest = _render_digests(text, parse_mode, reply_markup, disable_web_page_preview, kwargs)
+        edit_date = getattr(message, "edit_date", None)
+        last_render = last_renders.get(render_key) if render_key and edit_date else None
+        same_text = last_render is not None and last_render[0] == text_digest and last_render[2] == edit_date
+        if same_text and last_render[1] == markup_digest:
+            await _answer_callback_query(self.callback_query)
+            return message
+
+        if same_text:
+            edit = self.callback_query.edit_message_reply_markup(reply_markup=reply_markup)
+        else:
+            edit = self.callback_query.edit_message_text(
+                text=text,
+                parse_mode=parse_mode,
+                reply_markup=reply_markup,
+                disable_web_page_preview=disable_web_page_preview,
+                **kwargs,
+            )
+
+        # Edit the message and answer the callback query concurrently, they are independent requests
         try:
-            await self.callback_query.answer()
-        except Exception:
-            # does not matter much
-            ...
+            result, _ = await asyncio.gather(edit, _answer_callback_query(self.callback_query))
+        except BadRequest as e:
+            if "Message is not modified" not in e.message:
+                raise
+            return message
+
+        if render_key and isinstance(result, Message):
+            if len(last_renders) >= MAX_TRACKED_RENDERS:
+                # dicts keep insertion order, so the first entry is the oldest one
+                del last_renders[next(iter(last_renders))]
+            last_renders[render_key] = (text_digest, markup_digest, result.edit_date)
 
         return result
 
@@ -221,15 +274,18 @@ else:
         if self.callback_query is None:
             return None
 
-        # Edit the message reply markup and return the result
-        result = await self.callback_query.edit_message_reply_markup(reply_markup=reply_markup, **kwargs)
-
-        # Answer the callback query first
-        try:
-            await self.callback_query.answer(text=answer_text, show_alert=show_alert)
-        except Exception:
-            # does not matter much
-            ...
+        # The callback's message carries its current keyboard, so an edit that would leave it as it
+        # is (e.g. tapping a button that re-renders the same buttons) can be skipped
+        message = self.callback_query.message
+        if message is not None and getattr(message, "reply_markup", None) == reply_markup:
+            await _answer_callback_query(self.callback_query, text=answer_text, show_alert=show_alert)
+            return message
+
+        # Edit the message reply markup and answer the callback query concurrently
+        result, _ = await asyncio.gather(
+            self.callback_query.edit_message_reply_markup(reply_markup=reply_markup, **kwargs),
+            _answer_callback_query(self.callback_query, text=answer_text, show_alert=show_alert),
+        )
 
         return result
 
@@ -256,20 +312,19 @@ else:
         if self.callback_query is None:
             return False
 
-        # Delete the message and return the result
+        # The message can be missing or inaccessible, and bad kwargs fail as soon as delete() is called
         try:
-            await self.callback_query.message.delete(**kwargs)
-
-            # Answer the callback query first
-            try:
-                await self.callback_query.answer(text=answer_text, show_alert=show_alert)
-            except Exception:
-                # does not matter much
-                ...
+            deletion = self.callback_query.message.delete(**kwargs)
         except Exception:
             return False
-        else:
-            return True
+
+        # Delete the message and answer the callback query concurrently, they are independent requests
+        delete_result, _ = await asyncio.gather(
+            deletion,
+            _answer_callback_query(self.callback_query, text=answer_text, show_alert=show_alert),
+            return_exceptions=True,
+        )
+        return not isinstance(delete_result, Exception)
 
     def _callback_data_suffix_property(self: TelegramUpdate) -> str:
         """
@@ -284,11 +339,11 @@ else:
         if self.callback_query is None or self.callback_query.data is None:
             raise ValueError("No callback_query or callback_query.data found in update")
 
-        parts = self.callback_query.data.split("_", 1)
-        if not parts[1]:
+        _, _, suffix = self.callback_query.data.partition("_")
+        if not suffix:
             raise ValueError("No substring after '_' in callback_query.data")
 
-        return parts[1]
+        return suffix
 
     def _message_id_property(self: TelegramUpdate) -> int:
         """
@@ -348,3 +403,19 @@ def get_chat_id(update: TelegramUpdate) -> int:
 
 
 __all__ = ["Update", "get_chat_id"]
+
+
+def is_markdown_parse_error(error: Exception) -> bool:
+    """
+    Checks whether an error is Telegram rejecting a message because of malformed Markdown.
+
+    Telegram reports these as a BadRequest whose message starts with "Can't parse entities".
+    Callers typically react to it by sending the same text again without a parse mode.
+
+    Args:
+        error: The exception raised while sending or editing a message
+
+    Returns:
+        True if the error was caused by Markdown that Telegram could not parse
+    """
+    return isinstance(error, BadRequest) and error.message.startswith("Can't parse entities")
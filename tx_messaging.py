@@ -2,7 +2,6 @@ import logging
 import os
 from datetime import datetime
 
-import pytz
 import telegram.error
 from lunchable.models import TransactionObject
 from telegram import InlineKeyboardMarkup
@@ -11,8 +10,8 @@ from telegram.ext import ContextTypes
 
 from lunch import get_lunch_client_for_chat_id
 from persistence import get_db
-from telegram_extensions import Update
-from utils import Keyboard, clean_md, make_tag
+from telegram_extensions import Update, is_markdown_parse_error
+from utils import Keyboard, clean_md, get_timezone, make_tag
 
 logger = logging.getLogger("messaging")
 
@@ -107,10 +106,10 @@ def format_transaction_datetime(transaction: TransactionObject, show_datetime: b
     if transaction.plaid_metadata:
         authorized_datetime = transaction.plaid_metadata.get("authorized_datetime", None)
         if authorized_datetime:
-            date_time = datetime.fromisoformat(authorized_datetime.replace("Z", "-02:00"))
-            pst_tz = pytz.timezone("US/Pacific")
-            pst_date_time = date_time.astimezone(pst_tz)
             if show_datetime:
+                # only parse and convert the authorized time when it is actually shown
+                date_time = datetime.fromisoformat(authorized_datetime.replace("Z", "-02:00"))
+                pst_date_time = date_time.astimezone(get_timezone("US/Pacific"))
                 return pst_date_time.strftime("%a, %b %d at %I:%M %p PST")
             else:
                 return transaction.date.strftime("%a, %b %d")
@@ -258,7 +257,7 @@ async def send_transaction_message(
     try:
         new_msg_id = await dispatch_message(parse_mode=ParseMode.MARKDOWN)
     except telegram.error.BadRequest as e:
-        if "Can't parse entities" in str(e):
+        if is_markdown_parse_error(e):
             logger.warning(f"Markdown parsing failed for edit in chat_id {chat_id}, retrying without markdown: {e}")
             # Retry without markdown formatting
             new_msg_id = await dispatch_message(parse_mode=None)
@@ -1,6 +1,9 @@
 import os
+import re
+from functools import lru_cache
 
 import emoji
+import pytz
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 
 from persistence import Settings, get_db
@@ -12,32 +15,37 @@ def is_emoji(char):
     return char in emoji.EMOJI_DATA
 
 
+# Translation tables apply every substitution in a single pass over the string
+_CLEAN_MD_V2_TABLE = str.maketrans({" ": None, ".": "\\.", "!": "\\!", "*": "\\*", "_": "\\_", "-": "\\_", "/": "\\_"})
+_TAG_TABLE = str.maketrans({" ": None, ".": None, "*": "\\*", "_": "\\_", "-": "\\_", "/": "\\_"})
+_CLEAN_MD_TABLE = str.maketrans("_*`", "   ")
+# Every character that must be escaped in MarkdownV2 text (outside code spans)
+_MD_V2_ESCAPE_TABLE = str.maketrans({char: f"\\{char}" for char in "\\_*[]()~`>#+-=|{}.!"})
+
+
+# Status labels rendered in the settings menus, indexed by the setting's boolean value
+ON_OFF_LABELS = ("🔴 ᴏꜰꜰ", "🟢 ᴏɴ")
+
+
+def on_off(enabled: bool) -> str:
+    return ON_OFF_LABELS[bool(enabled)]
+
+
 def clean_md_v2(text: str) -> str:
-    return (
-        text.replace(" ", "")
-        .replace(".", "\\.")
-        .replace("!", "\\!")
-        .replace("*", "\\*")
-        .replace("_", "\\_")
-        .replace("-", "\\_")
-        .replace("/", "\\_")
-        .strip()
-    )
+    return text.translate(_CLEAN_MD_V2_TABLE).strip()
+
+
+def escape_markdown_v2(text: str) -> str:
+    """Escapes text so that Telegram's MarkdownV2 parser renders it literally."""
+    return text.translate(_MD_V2_ESCAPE_TABLE)
 
 
+# Category, account and tag names repeat across every transaction message
+@lru_cache(maxsize=1024)
 def make_tag(t: str, title=False, tagging=True, no_emojis=False) -> str:
     result = "".join([char for char in t if char not in emoji.EMOJI_DATA])
     if tagging:
-        result = (
-            result.title()
-            .replace(" ", "")
-            .replace(".", "")
-            .replace("*", "\\*")
-            .replace("_", "\\_")
-            .replace("-", "\\_")
-            .replace("/", "\\_")
-            .strip()
-        )
+        result = result.title().translate(_TAG_TABLE).strip()
 
     # find emojis so we can all put them at the beginning
     # otherwise tagging will break
@@ -74,11 +82,7 @@ class Keyboard(list):
         if not btns:
             raise ValueError("At least one button must be provided.")
 
-        kbd = Keyboard()
-        for btn in btns:
-            if btn:
-                kbd += btn
-        return kbd.build()
+        return Keyboard(btn for btn in btns if btn).build()
 
 
 ACCOUNT_TYPE_EMOJIS = {
@@ -127,13 +131,62 @@ CONVERSATION_MSG_ID = "conversation_msg_id"
 
 
 def clean_md(text: str) -> str:
-    return text.replace("_", " ").replace("*", " ").replace("`", " ")
+    return text.translate(_CLEAN_MD_TABLE)
+
+
+# Code spans, code blocks and links are left as they are by sanitize_md
+_MD_VERBATIM_PATTERN = re.compile(r"```.*?```|`[^`\n]*`|\[[^\]\n]*\]\([^)\n]*\)", re.DOTALL)
+_MD_BULLET_PATTERN = re.compile(r"^([ \t]*)\*[ \t]+", re.MULTILINE)
+_MD_HEADER_PATTERN = re.compile(r"^#{1,6}[ \t]+(.+?)[ \t]*#*[ \t]*$", re.MULTILINE)
+_MD_INTRAWORD_UNDERSCORE_PATTERN = re.compile(r"(?<=[^\W_])_(?=[^\W_])")
+_MD_UNESCAPED_PATTERNS = {char: re.compile(rf"(?<!\\){re.escape(char)}") for char in ("*", "_", "`")}
+_MD_STRAY_BRACKET_PATTERN = re.compile(r"(?<!\\)\[(?![^\]\n]*\]\([^)\n]*\))")
+
+
+def sanitize_md(text: str) -> str:
+    """Fixes the Markdown mistakes LLMs usually make for Telegram's (legacy) Markdown parser.
+
+    Telegram rejects the whole message when an entity is not closed, so instead of sending
+    twice (once with Markdown, once as plain text after the error) the usual culprits are
+    fixed upfront: **double** markers, # headers, * bullets, snake_case words, and unpaired
+    *, _, ` or [.
+    """
+    parts = []
+    last_end = 0
+    for match in _MD_VERBATIM_PATTERN.finditer(text):
+        parts.append(_sanitize_md_text(text[last_end : match.start()]))
+        parts.append(match.group())
+        last_end = match.end()
+    parts.append(_sanitize_md_text(text[last_end:]))
+    return "".join(parts)
+
+
+def _sanitize_md_text(text: str) -> str:
+    text = _MD_BULLET_PATTERN.sub(r"\1• ", text)
+    text = _MD_HEADER_PATTERN.sub(lambda match: f"*{match.group(1).replace('*', '')}*", text)
+    text = text.replace("**", "*").replace("__", "_")
+    text = _MD_INTRAWORD_UNDERSCORE_PATTERN.sub(r"\\_", text)
+    text = _MD_STRAY_BRACKET_PATTERN.sub(r"\\[", text)
+    for char, pattern in _MD_UNESCAPED_PATTERNS.items():
+        markers = list(pattern.finditer(text))
+        # any backtick left outside a code span is unpaired; for * and _ only an odd one out is
+        if char == "`" or len(markers) % 2:
+            stray = markers if char == "`" else markers[-1:]
+            for marker in reversed(stray):
+                text = f"{text[: marker.start()]}\\{char}{text[marker.end() :]}"
+    return text
 
 
 # Re-export the get_chat_id function from telegram_extensions module
 get_chat_id = _get_chat_id
 
 
+@lru_cache(maxsize=64)
+def get_timezone(name: str | None) -> pytz.BaseTzInfo:
+    """Returns the pytz timezone with the given name (UTC if empty), memoized per name."""
+    return pytz.timezone(name or "UTC")
+
+
 def ensure_token(update: Update) -> Settings:
     # make sure the user has registered a token by trying to get the settings
     # which will raise an exception if the token is not set
@@ -141,6 +194,28 @@ def ensure_token(update: Update) -> Settings:
     return get_db().get_current_settings(chat_id)
 
 
+def is_stale_toggle(update: Update, current: bool) -> bool:
+    """Returns True if a toggle was tapped on an outdated keyboard.
+
+    Toggle buttons carry the state they were rendered with in their callback data. When it no longer
+    matches the current state, an earlier tap (e.g. a double tap or another settings message) already
+    flipped the setting. Flipping it again would undo it, so callers skip the write and only redraw
+    the menu with the current state.
+    """
+    return update.callback_data_suffix != str(current)
+
+
+@lru_cache(maxsize=1)
+def get_admin_user_ids() -> frozenset[int]:
+    """The admin IDs from the comma-separated ADMIN_USER_ID, parsed on first use rather than on every check."""
+    admin_ids = os.getenv("ADMIN_USER_ID", "")
+    try:
+        return frozenset(int(id.strip()) for id in admin_ids.split(",") if id.strip())
+    except ValueError:
+        # Handle case where ADMIN_USER_ID contains non-integer values
+        return frozenset()
+
+
 def is_admin_user(chat_id: int) -> bool:
     """Check if the given chat_id belongs to an admin user.
 
@@ -153,14 +228,4 @@ def is_admin_user(chat_id: int) -> bool:
     Returns:
         True if the chat_id is in the admin list, False otherwise
     """
-    admin_ids = os.getenv("ADMIN_USER_ID", "")
-    if not admin_ids:
-        return False
-
-    try:
-        admin_id_list = [int(id.strip()) for id in admin_ids.split(",") if id.strip()]
-    except ValueError:
-        # Handle case where ADMIN_USER_ID contains non-integer values
-        return False
-    else:
-        return chat_id in admin_id_list
+    return chat_id in get_admin_user_ids()
@@ -13,7 +13,6 @@ from lunch import get_lunch_client_for_chat_id
 
 # Initialize logger
 logger = logging.getLogger("web_server")
-logging.basicConfig(level=logging.INFO)
 
 
 @dataclass